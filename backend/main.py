@@ -722,16 +722,14 @@ async def fastapi_attendance_check_in(current_user: dict = Depends(get_current_u
     db_user = crud.get_user_by_email(db, email=current_user.get("user_identifier"))
     if not db_user: raise HTTPException(status_code=404, detail="User not found")
     if not db_user.odoo_employee_id: raise HTTPException(status_code=400, detail="User not linked to HR for check-in.")
-    payload_for_odoo = {"employee_id": str(db_user.odoo_employee_id)}
-    return await _perform_odoo_call(db_user, db, "/ess/api/attendance/check-in", multipart_data=payload_for_odoo) # Sent as form data
+    return await _perform_odoo_call(db_user, db, "/ess/api/attendance/check-in/{employee_id}", method="POST") # Employee ID in the URL
 
 @app.post("/api/v1/attendance/check-out", response_model=LiveAttendanceStatusResponse)
 async def fastapi_attendance_check_out(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     db_user = crud.get_user_by_email(db, email=current_user.get("user_identifier"))
     if not db_user: raise HTTPException(status_code=404, detail="User not found")
     if not db_user.odoo_employee_id: raise HTTPException(status_code=400, detail="User not linked to HR for check-out.")
-    payload_for_odoo = {"employee_id": str(db_user.odoo_employee_id)}
-    return await _perform_odoo_call(db_user, db, "/ess/api/attendance/check-out", multipart_data=payload_for_odoo) # Sent as form data
+    return await _perform_odoo_call(db_user, db, "/ess/api/attendance/check-out/{employee_id}", method="POST") # Employee ID in the URL
 
 @app.get("/api/v1/attendance/today-log", response_model=TodaysAttendanceLogResponse)
 async def get_fastapi_todays_attendance_log(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
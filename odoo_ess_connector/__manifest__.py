@@ -28,6 +28,7 @@
         'security/ir.model.access.csv', # Define model access rights
         'views/ess_api_token_views.xml', 
         'views/settings_views.xml',
+        'data/ir_cron_data.xml',
         # Add views later if needed (e.g., for API Token management)
         # 'views/ess_api_token_views.xml',
         # 'views/settings_views.xml',
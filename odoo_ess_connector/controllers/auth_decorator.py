@@ -1,27 +1,62 @@
 # In odoo_ess_connector/controllers/auth_decorator.py
+import atexit
+import concurrent.futures
 import functools
-import werkzeug # Not strictly used here now, but good to keep if controllers use it
-from odoo import http, fields, api # api is needed for Environment.manage
+import ipaddress
 from odoo.http import request, Response
+from ..models.ess_api_log import flush_log_buffer_in_new_cursor
 import json
 import logging
 import time
 
 _logger = logging.getLogger(__name__)
 
+# Buffered log entries are flushed from a small background pool so the API response never waits on the INSERT.
+_LOG_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix='ess-log')
+atexit.register(_LOG_EXECUTOR.shutdown) # Drain pending log flushes on server shutdown
+
 def _create_log_entry(log_data):
     """
-    Helper function to create an API log entry in a new cursor.
-    Ensures log creation is attempted independently of the main request transaction.
+    Helper function to record an API log entry without blocking the response.
+    The entry is queued in the ess.api.log buffer; once the buffer is full or its flush interval
+    has elapsed, the batch is written in a background cursor, independently of the request transaction.
+    """
+    try:
+        if request.env['ess.api.log']._buffer_log(dict(log_data)):
+            _LOG_EXECUTOR.submit(flush_log_buffer_in_new_cursor, request.db)
+    except Exception as log_e: # e.g. executor already shut down
+        _logger.error(f"CRITICAL: Failed to schedule API log entry for {log_data.get('endpoint')}: {log_e}", exc_info=True)
+
+@functools.lru_cache(maxsize=8)
+def _parse_allowed_ips(allowed_ips_str):
+    """
+    Parses the 'ess_allowed_ips' setting once per distinct value.
+    Returns a (exact_ips, networks) tuple: a frozenset of bare addresses for O(1) lookup
+    and a tuple of ipaddress networks for entries written in CIDR notation.
     """
+    entries = [ip.strip() for ip in allowed_ips_str.split(',') if ip.strip()] # Ensure no empty strings
+    exact_ips = frozenset(e for e in entries if '/' not in e)
+    networks = []
+    for entry in entries:
+        if '/' not in entry:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+        except ValueError:
+            _logger.warning(f"Ignoring invalid network '{entry}' in ESS allowed IPs setting.")
+    return exact_ips, tuple(networks)
+
+def _is_ip_allowed(request_ip, exact_ips, networks):
+    """Checks the request IP against the parsed allow-list (exact match first, then CIDR ranges)."""
+    if request_ip in exact_ips:
+        return True
+    if not networks or not request_ip:
+        return False
     try:
-        log_record = request.env['ess.api.log'].sudo().create(log_data) # Use sudo for robustness
-        _logger.info(
-            f"API Log created (ID: {log_record.id}) for endpoint: {log_data.get('endpoint')} "
-            f"by user ID: {log_data.get('user_id', 'N/A')}"
-        )
-    except Exception as log_e:
-        _logger.error(f"CRITICAL: Failed to create API log entry (within main transaction) for {log_data.get('endpoint')}: {log_e}", exc_info=True)
+        ip_obj = ipaddress.ip_address(request_ip)
+    except ValueError:
+        return False
+    return any(ip_obj in net for net in networks)
 
 def api_key_auth(required_model=None):
     """
@@ -29,12 +64,13 @@ def api_key_auth(required_model=None):
     and optionally enforce model-based scope.
     If token scope is empty/None, access is allowed (subject to user permissions).
     If token scope is defined, it restricts to only those models.
+    Decorated controllers must return an odoo.http.Response object.
     :param required_model: str, the technical name of the Odoo model this endpoint primarily interacts with.
     """
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            start_time = time.time()
+            start_time = time.monotonic() # Monotonic clock: durations unaffected by wall-clock adjustments
             request_ip = request.httprequest.remote_addr
             endpoint_path = request.httprequest.path
             http_method = request.httprequest.method
@@ -58,8 +94,8 @@ def api_key_auth(required_model=None):
 
                 allowed_ips_str = IrConfigParameter.get_param('odoo_ess_connector.ess_allowed_ips', '').strip()
                 if allowed_ips_str:
-                    allowed_ips = [ip.strip() for ip in allowed_ips_str.split(',') if ip.strip()] # Ensure no empty strings
-                    if request_ip not in allowed_ips:
+                    exact_ips, networks = _parse_allowed_ips(allowed_ips_str)
+                    if not _is_ip_allowed(request_ip, exact_ips, networks):
                         _logger.warning(f"ESS API call to {endpoint_path} denied: IP {request_ip} not in allowed list.")
                         log_vals.update({'response_status_code': 403, 'message': f"Forbidden: IP {request_ip} not allowed."})
                         _create_log_entry(log_vals)
@@ -85,7 +121,8 @@ def api_key_auth(required_model=None):
                 return Response(json.dumps({'error': 'Unauthorized', 'message': 'Missing Bearer token.'}),
                                 status=401, headers={'Content-Type': 'application/json'})
 
-            authenticated_user_recordset = request.env['ess.api.token'].sudo()._validate_token(token_str)
+            # Returns the token's (id, user_id, scope) with the user: one cached lookup per request
+            authenticated_user_recordset, token_auth_data = request.env['ess.api.token'].sudo()._validate_token(token_str)
             if not authenticated_user_recordset:
                 _logger.warning(f"API call to {endpoint_path} denied: Invalid or inactive token: {token_str[:6]}...")
                 log_vals.update({'response_status_code': 401, 'message': 'Unauthorized: Invalid or inactive API token.'})
@@ -94,16 +131,24 @@ def api_key_auth(required_model=None):
                                 status=401, headers={'Content-Type': 'application/json'})
 
             log_vals['user_id'] = authenticated_user_recordset.id
-            token_record = request.env['ess.api.token'].sudo().search([('token', '=', token_str)], limit=1)
-            if token_record:
-                log_vals['api_token_id'] = token_record.id
+            if token_auth_data:
+                log_vals['api_token_id'] = token_auth_data[0]
+                retry_after = request.env['ess.api.token'].sudo()._consume_rate_limit(token_auth_data[0])
+                if retry_after is not None:
+                    _logger.warning(f"API call to {endpoint_path} denied: Rate limit exceeded for token {token_str[:6]}...")
+                    message = f"Rate limit exceeded for this API token. Retry in {retry_after}s."
+                    log_vals.update({'response_status_code': 429, 'message': f"Too Many Requests: {message}"})
+                    _create_log_entry(log_vals)
+                    return Response(json.dumps({'error': 'Too Many Requests', 'message': message}),
+                                    status=429, headers={'Content-Type': 'application/json',
+                                                         'Retry-After': str(retry_after)})
             else: # Should not happen if _validate_token returned a user
                 _logger.error(f"Consistency issue: Token validated for user {authenticated_user_recordset.login} but token record not found by string '{token_str[:6]}...'.")
 
 
             # --- 3. Scope Check (Revised Logic) ---
-            if required_model and token_record: # Only check scope if endpoint requires it and we have token details
-                current_scope_str = token_record.scope.strip() if token_record.scope else ''
+            if required_model and token_auth_data: # Only check scope if endpoint requires it and we have token details
+                current_scope_str = token_auth_data[2].strip()
 
                 if current_scope_str: # If scope IS defined on the token, then enforce it
                     allowed_models = [s.strip() for s in current_scope_str.split(',') if s.strip()]
@@ -125,7 +170,7 @@ def api_key_auth(required_model=None):
                     # Scope is NOT defined (empty string) on the token. This means "allow access to any required_model",
                     # subject to the user's underlying Odoo permissions.
                     _logger.info(f"Scope check passed (empty/None token scope implies all allowed): user {authenticated_user_recordset.login}, required '{required_model}'.")
-            elif required_model and not token_record:
+            elif required_model and not token_auth_data:
                 # This should ideally not be reached if token_str was valid and _validate_token returned a user
                 _logger.error(f"Internal inconsistency during scope check: Validated user but no token_record found. Token string: {token_str[:6]}...")
                 log_vals.update({'response_status_code': 500, 'message': 'Internal Server Error: Scope check inconsistency.'})
@@ -146,25 +191,22 @@ def api_key_auth(required_model=None):
             try:
                 response_obj = func(*args, **kwargs)
 
-                if not isinstance(response_obj, Response):
-                    _logger.error(
-                        f"Controller {func.__name__} for {endpoint_path} did not return an odoo.http.Response object. "
-                        f"Got: {type(response_obj)}. Attempting to convert if dict."
-                    )
-                    if isinstance(response_obj, dict):
-                        response_obj = Response(json.dumps(response_obj), status=200, headers={'Content-Type': 'application/json'})
-                    else:
-                        # This indicates a programming error in the controller
-                        raise TypeError(f"Controller {func.__name__} for {endpoint_path} must return an odoo.http.Response object.")
+                # Contract: decorated controllers must return an odoo.http.Response (see _json_response).
+                # Checked only in debug runs; stripped under `python -O`.
+                assert isinstance(response_obj, Response), f"{func.__name__} must return an odoo.http.Response object"
 
                 log_vals['response_status_code'] = response_obj.status_code
-                try:
-                    response_data_str = response_obj.data.decode('utf-8')
-                    response_data_json = json.loads(response_data_str)
-                    msg_detail = response_data_json.get('message', response_data_json.get('error_description', response_data_json.get('error', ''))) # Check more error keys
-                    log_vals['message'] = f"{'Success' if response_obj.status_code < 400 else 'Error'}: {msg_detail or response_data_str[:100]}"
-                except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+                if response_obj.direct_passthrough or response_obj.content_encoding:
+                    # Streamed bodies (file downloads) and compressed JSON are not read back just to build the log message
                     log_vals['message'] = f"{'Success' if response_obj.status_code < 400 else 'Error'} (Status: {response_obj.status_code}, Content-Type: {response_obj.mimetype})"
+                else:
+                    try:
+                        response_data_str = response_obj.data.decode('utf-8')
+                        response_data_json = json.loads(response_data_str)
+                        msg_detail = response_data_json.get('message', response_data_json.get('error_description', response_data_json.get('error', ''))) # Check more error keys
+                        log_vals['message'] = f"{'Success' if response_obj.status_code < 400 else 'Error'}: {msg_detail or response_data_str[:100]}"
+                    except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+                        log_vals['message'] = f"{'Success' if response_obj.status_code < 400 else 'Error'} (Status: {response_obj.status_code}, Content-Type: {response_obj.mimetype})"
 
             except Exception as controller_e:
                 _logger.error(f"Error executing API endpoint {endpoint_path} for user {authenticated_user_recordset.id}: {controller_e}", exc_info=True)
@@ -174,7 +216,7 @@ def api_key_auth(required_model=None):
                 error_body_json = json.dumps({'error': 'Internal Server Error', 'message': 'An error occurred processing your request.'})
                 response_obj = Response(error_body_json, status=500, headers={'Content-Type': 'application/json'})
             finally:
-                log_vals['duration_ms'] = round((time.time() - start_time) * 1000, 2)
+                log_vals['duration_ms'] = round((time.monotonic() - start_time) * 1000, 2)
                 _create_log_entry(log_vals)
 
             return response_obj
@@ -1,26 +1,168 @@
 # -*- coding: utf-8 -*-
 # In odoo_ess_connector/controllers/main.py
+import collections
+import gzip
+import functools
 import json
 import werkzeug # For exceptions like NotFound, Forbidden
+import werkzeug.wsgi
 import logging # For logging
 from odoo import http, fields, exceptions # Import base Odoo exceptions
 from odoo.http import request, route, Response # Import Response object
-import base64 # For potential PDF handling later
-from datetime import datetime, date, time # Import date, time
+import io
+import os
+from datetime import datetime, date, timedelta
 import pytz # For timezone handling
+import re
+import threading
+import time as time_module # 'time' is the datetime.time class in this module
+
+try:
+    import orjson # Optional: much faster JSON (de)serialization when installed
+except ImportError:
+    orjson = None
+
+try:
+    import brotli # Optional: better ratio than gzip for JSON responses when installed
+except ImportError:
+    brotli = None
 
 # Import the custom authentication decorator
 from .auth_decorator import api_key_auth
+from ..rate_limit import TokenBucket
 
 # Setup logger for this controller
 _logger = logging.getLogger(__name__)
 
+# orjson.loads and json.loads both accept bytes, so request bodies can be parsed without decoding first
+_json_loads = orjson.loads if orjson else json.loads
+
+# orjson options for responses: dict keys may be ints (e.g. id maps), aware datetimes in UTC are written with 'Z'
+_ORJSON_DUMPS_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z) if orjson else 0
+
+# Serializes a response payload to UTF-8 bytes. date/datetime values may be passed as-is: orjson writes them
+# as ISO-8601 natively, the stdlib fallback via default=str (same output for dates). The fallback encoder is
+# built once, compact like orjson's output, instead of json.dumps() constructing one per call.
+if orjson:
+    def _json_dumps(data):
+        return orjson.dumps(data, default=str, option=_ORJSON_DUMPS_OPTIONS) # Returns UTF-8 bytes directly
+else:
+    _json_encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str).encode
+
+    def _json_dumps(data):
+        return _json_encode(data).encode('utf-8')
+
+# JSON responses smaller than this are sent uncompressed (compression overhead outweighs the saved bytes)
+_COMPRESS_MIN_BYTES = 1024
+
+# Columns read by _prepare_employee_data; loading only these avoids prefetching every stored field
+_EMPLOYEE_DATA_FIELDS = [
+    'name', 'job_id', 'employee_title', 'work_email', 'work_phone',
+    'mobile_phone', 'work_location_id', 'department_id', 'user_id',
+]
+_PARTNER_ADDRESS_FIELDS = ['street', 'street2', 'city', 'state_id', 'zip', 'country_id']
+# Columns returned by the admin employee search
+_EMPLOYEE_SEARCH_FIELDS = [
+    'name', 'work_email', 'job_id', 'employee_title', 'department_id', 'work_phone', 'mobile_phone',
+]
+
+# State literals shared by the endpoints (tuples: immutable, built once, accepted in 'in' domains).
+# Pending leave states before final approval: 'confirm' (To Submit by employee), 'to_approve' (Submitted / To Approve by manager).
+# Some might also consider 'draft'. Check your hr.leave model's 'state' field selection options.
+_LEAVE_PENDING_STATES = ('confirm', 'to_approve')
+# Final approved leave state ('validate1' is the intermediate state of double validation workflows)
+_LEAVE_APPROVED_STATES = ('validate',)
+# Payslips that are listed and whose PDF can be downloaded
+_PAYSLIP_DONE_STATES = ('done', 'paid')
+# Prefix of the 'description' of payslip PDFs stored by download_payslip_pdf, followed by the payslip's write_date
+_PAYSLIP_PDF_TAG = 'ess_payslip_pdf:'
+
+# Full tracebacks are expensive to format and can flood the log under scan/attack traffic
+_err_bucket = TokenBucket(rate=1.0, capacity=10)
+
+def _log_unexpected_error(message):
+    """
+    Logs an unexpected controller error; must be called from an except block.
+    The traceback is included only while the rate limiter allows it, otherwise just the message.
+    """
+    if _err_bucket.allow():
+        _logger.exception(message)
+    else:
+        _logger.error(message)
+
+class _TTLCache:
+    """Small thread-safe LRU cache whose entries expire `ttl` seconds after being stored."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time_module.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time_module.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False) # Evict the least recently used entry
+
+# Admin employee search results, keyed by (db, term, limit, user): dedupes repeated typeahead queries
+_employee_search_cache = _TTLCache(maxsize=256, ttl=5)
+
+# Document upload limits, checked before the file content is read into memory
+_ALLOWED_UPLOAD_MIMETYPES = ('application/pdf', 'image/jpeg', 'image/png')
+_MAX_UPLOAD_BYTES = 20 * 1024 * 1024 # 20 MB
+
+# Characters not safe in a download filename (path separators, control characters, quotes) are replaced by '_'.
+# Anything else is kept, e.g. Arabic names: http.content_disposition encodes non-ASCII filenames (RFC 5987).
+_FILENAME_RE = re.compile(r'[\\/\x00-\x1f\x7f"]+')
+
+@functools.lru_cache(maxsize=64)
+def _get_tz(tz_name):
+    """Returns the pytz timezone for a name, built once per process (UTC if unknown)."""
+    try:
+        return pytz.timezone(tz_name or 'UTC')
+    except pytz.UnknownTimeZoneError:
+        return pytz.utc
+
 class EssApiController(http.Controller):
 
     # --------------------------------------------------------------------------
     # Helper Methods
     # --------------------------------------------------------------------------
 
+    def _prefetch_employee_data(self, employees):
+        """
+        Loads the fields used by _prepare_employee_data in batch (one query per model)
+        for the whole recordset. Called once by the endpoint on the recordset it formats,
+        never per record.
+        """
+        employees = employees.with_context(prefetch_fields=False)
+        employees.read(_EMPLOYEE_DATA_FIELDS)
+        partners = employees.mapped('user_id.partner_id')
+        partners.read(_PARTNER_ADDRESS_FIELDS)
+        # State/country names are only needed for partners whose address gets formatted
+        partners = partners.filtered(lambda partner: partner.street or partner.city)
+        for related in (
+            partners.mapped('state_id'), partners.mapped('country_id'),
+            employees.mapped('job_id'), employees.mapped('employee_title'),
+            employees.mapped('work_location_id'), employees.mapped('department_id'),
+        ):
+            related.read(['name'])
+        return employees
+
     def _prepare_employee_data(self, employee):
         """Selects and formats fields from hr.employee record (Odoo 15+ compatible)."""
         if not employee:
@@ -30,7 +172,8 @@ class EssApiController(http.Controller):
         user = employee.user_id
         private_partner = user.partner_id if user else None
         formatted_address = None
-        if private_partner:
+        # No street and no city: nothing worth formatting (also skips the state/country lookups)
+        if private_partner and (private_partner.street or private_partner.city):
             address_parts = [
                 private_partner.street,
                 private_partner.street2,
@@ -57,7 +200,17 @@ class EssApiController(http.Controller):
     def _json_response(self, data, status=200):
         """Helper to create a JSON Response object."""
         headers = {'Content-Type': 'application/json'}
-        body = json.dumps(data, ensure_ascii=False)
+        body = _json_dumps(data)
+        if len(body) >= _COMPRESS_MIN_BYTES:
+            # Lists (attendance log, documents, employee search) compress 5-10x; honour the client's Accept-Encoding
+            accept_encodings = request.httprequest.accept_encodings
+            headers['Vary'] = 'Accept-Encoding'
+            if brotli and accept_encodings.quality('br') > 0:
+                body = brotli.compress(body, quality=4)
+                headers['Content-Encoding'] = 'br'
+            elif accept_encodings.quality('gzip') > 0:
+                body = gzip.compress(body, compresslevel=5)
+                headers['Content-Encoding'] = 'gzip'
         return Response(body, status=status, headers=headers)
 
     def _error_response(self, error_code, message, status_code):
@@ -68,15 +221,26 @@ class EssApiController(http.Controller):
     # --- ATTENDANCE ENDPOINTS (Refactored/New for hr.attendance) ---
 
     def _get_employee_and_validate_access(self, employee_id):
-        """Helper to fetch employee and validate access. Raises Werkzeug exceptions."""
-        employee = request.env['hr.employee'].browse(employee_id)
-        if not employee.exists():
+        """
+        Helper to fetch employee and validate access. Raises Werkzeug exceptions.
+        Returns a dict with the employee's 'id', 'name' and 'company_id', read with one search_read.
+        Archived employees are included (active_test=False), like the former browse().exists() check.
+        """
+        rows = request.env['hr.employee'].with_context(active_test=False).search_read([('id', '=', employee_id)], ['name', 'company_id'], limit=1)
+        if not rows:
             raise werkzeug.exceptions.NotFound(f"Employee with ID {employee_id} not found.")
+        employee = rows[0]
         # Basic check: user must be linked to the employee or be an admin/manager (add more complex rules later)
         # if request.env.user.employee_id != employee and not request.env.user.has_group('hr_attendance.group_hr_attendance_manager'): # Example manager check
         #      raise werkzeug.exceptions.Forbidden(f"You do not have permission to manage attendance for employee ID {employee_id}.")
         return employee
 
+    def _check_employee_exists(self, employee_id):
+        """Raises NotFound if no hr.employee row has this ID. Plain SQL: no recordset is built."""
+        request.env.cr.execute("SELECT 1 FROM hr_employee WHERE id = %s", (employee_id,))
+        if not request.env.cr.fetchone():
+            raise werkzeug.exceptions.NotFound(f"Employee with ID {employee_id} not found.")
+
     def _get_current_odoo_attendance_status(self, employee_id):
         """Determines current check-in/out status from hr.attendance for an employee."""
         # Find the latest attendance record for the employee
@@ -87,18 +251,28 @@ class EssApiController(http.Controller):
         if not latest_attendance:
             return {"status": "checked_out", "last_action_time": None, "message": "No previous attendance recorded. Ready to check in."}
 
-        if not latest_attendance.check_out: # If check_out is not set, employee is checked in
-            check_in_user_tz_str = fields.Datetime.context_timestamp(latest_attendance, latest_attendance.check_in).strftime('%Y-%m-%d %H:%M:%S')
+        return self._format_attendance_status(latest_attendance.check_in, latest_attendance.check_out)
+
+    def _format_attendance_status(self, check_in_utc, check_out_utc):
+        """
+        Builds the status dict of _get_current_odoo_attendance_status from an attendance's (naive UTC)
+        check_in/check_out, so check-in/out can answer from the record they just wrote without a new search.
+        """
+        # Same timezone resolution as fields.Datetime.context_timestamp, with the tz object cached
+        user_tz = _get_tz(request.env.context.get('tz') or request.env['res.users']._ess_get_tz_name(request.env.uid))
+
+        if not check_out_utc: # If check_out is not set, employee is checked in
+            check_in_user_tz_str = pytz.utc.localize(check_in_utc).astimezone(user_tz).isoformat(sep=' ', timespec='seconds')[:19]
             return {
                 "status": "checked_in",
-                "last_action_time": fields.Datetime.to_string(latest_attendance.check_in),
+                "last_action_time": check_in_utc.isoformat(sep=' ', timespec='seconds'),
                 "message": f"Currently checked in since {check_in_user_tz_str}."
             }
         else: # Employee is checked out
-            check_out_user_tz_str = fields.Datetime.context_timestamp(latest_attendance, latest_attendance.check_out).strftime('%Y-%m-%d %H:%M:%S')
+            check_out_user_tz_str = pytz.utc.localize(check_out_utc).astimezone(user_tz).isoformat(sep=' ', timespec='seconds')[:19]
             return {
                 "status": "checked_out",
-                "last_action_time": fields.Datetime.to_string(latest_attendance.check_out),
+                "last_action_time": check_out_utc.isoformat(sep=' ', timespec='seconds'),
                 "message": f"Last action: Checked out at {check_out_user_tz_str}."
             }
     # --------------------------------------------------------------------------
@@ -127,6 +301,7 @@ class EssApiController(http.Controller):
             #     raise werkzeug.exceptions.Forbidden("Access Denied: You cannot view this employee's data.")
             # --- End Optional ---
 
+            employee = self._prefetch_employee_data(employee)
             data = self._prepare_employee_data(employee)
             return self._json_response(data)
 
@@ -137,7 +312,7 @@ class EssApiController(http.Controller):
             _logger.warning(f"Forbidden access attempt by user {request.env.user.id} to employee {employee_id}")
             return self._error_response('Forbidden', str(e), 403)
         except Exception as e:
-            _logger.error(f"Error fetching employee data for ID {employee_id}: {e}", exc_info=True)
+            _log_unexpected_error(f"Error fetching employee data for ID {employee_id}: {e}")
             return self._error_response('Internal Server Error', "An unexpected error occurred.", 500)
 
 
@@ -147,12 +322,12 @@ class EssApiController(http.Controller):
         """Fetches all active leave types (hr.leave.type). Requires Bearer token."""
         try:
             # Fetch leave types (consider adding domain filter if needed)
-            leave_types = request.env['hr.leave.type'].search([])
-            types_data = [{'id': lt.id, 'name': lt.name} for lt in leave_types]
+            # search_read returns plain dicts with only the requested columns
+            types_data = request.env['hr.leave.type'].search_read([], ['id', 'name'])
             return self._json_response(types_data)
 
         except Exception as e:
-            _logger.error(f"Error fetching leave types: {e}", exc_info=True)
+            _log_unexpected_error(f"Error fetching leave types: {e}")
             return self._error_response('Internal Server Error', 'Could not retrieve leave types.', 500)
 
 
@@ -162,13 +337,14 @@ class EssApiController(http.Controller):
         """Creates a new leave request (hr.leave). Requires Bearer token."""
         try:
             # Manually read and parse JSON body for type='http'
-            http_body = request.httprequest.data.decode('utf-8')
+            http_body = request.httprequest.data # Raw bytes, read once
             if not http_body:
                 _logger.warning("Received empty request body for leave submission.")
                 return self._error_response('Bad Request', 'Request body cannot be empty.', 400)
 
-            _logger.info(f"DEBUG: Raw HTTP body received: {http_body}")
-            actual_payload = json.loads(http_body)
+            if _logger.isEnabledFor(logging.DEBUG):
+                _logger.debug(f"Raw HTTP body received: {http_body!r}")
+            actual_payload = _json_loads(http_body) # Parse the raw bytes, no extra decode
             _logger.info(f"Received leave request payload for user {request.env.user.login}: {actual_payload}")
 
             # Validate required fields
@@ -187,9 +363,9 @@ class EssApiController(http.Controller):
                 to_date_str = actual_payload['to_date']
                 reason = actual_payload.get('note') # Optional
 
-                # Convert date strings; fields.Date.from_string handles YYYY-MM-DD
-                date_from = fields.Date.from_string(from_date_str)
-                date_to = fields.Date.from_string(to_date_str)
+                # Convert YYYY-MM-DD date strings (date.fromisoformat avoids strptime's format parsing)
+                date_from = date.fromisoformat(from_date_str)
+                date_to = date.fromisoformat(to_date_str)
 
                 if date_to < date_from:
                      raise ValueError("The 'to_date' cannot be earlier than the 'from_date'.")
@@ -199,9 +375,10 @@ class EssApiController(http.Controller):
                  raise werkzeug.exceptions.BadRequest(f"Invalid data format: {e}. Ensure IDs are integers and dates are YYYY-MM-DD.")
 
             # --- Validate Employee and Leave Type Existence ---
-            employee = request.env['hr.employee'].browse(employee_id)
-            if not employee.exists():
+            employee_row = request.env['hr.employee'].search_read([('id', '=', employee_id)], ['name'], limit=1)
+            if not employee_row:
                 raise werkzeug.exceptions.NotFound(f"Employee with ID {employee_id} not found.")
+            employee_name = employee_row[0]['name']
 
             leave_type_obj = request.env['hr.leave.type'].browse(leave_type_id)
             if not leave_type_obj.exists():
@@ -219,7 +396,7 @@ class EssApiController(http.Controller):
                 'holiday_status_id': leave_type_id,
                 'request_date_from': date_from,
                 'request_date_to': date_to,
-                'name': reason or f"Leave request for {employee.name}",
+                'name': reason or f"Leave request for {employee_name}",
             }
 
             _logger.info(f"Attempting to create hr.leave with values: {leave_values}")
@@ -237,7 +414,7 @@ class EssApiController(http.Controller):
 
         # --- Specific Odoo/Werkzeug Exception Handling ---
         except (exceptions.AccessError) as e:
-            _logger.error(f"Access error submitting leave: {e}", exc_info=True)
+            _logger.warning(f"Access error submitting leave: {e}")
             return self._error_response('Forbidden', f"Permission denied: {e}", 403)
         except (exceptions.UserError, exceptions.ValidationError) as e:
             _logger.error(f"Odoo validation error submitting leave: {e}")
@@ -248,7 +425,7 @@ class EssApiController(http.Controller):
              return self._error_response(e.name, e.description, e.code)
         # --- Generic Exception Handling ---
         except Exception as e:
-            _logger.error(f"Unexpected error ({type(e).__name__}) submitting leave request: {e}", exc_info=True)
+            _log_unexpected_error(f"Unexpected error ({type(e).__name__}) submitting leave request: {e}")
             return self._error_response('Internal Server Error', 'An unexpected error occurred while submitting the leave request.', 500)
 
     @route('/ess/api/payslips/<int:employee_id>', type='http', auth='none', methods=['GET'], csrf=False)
@@ -257,9 +434,7 @@ class EssApiController(http.Controller):
         """Fetches payslip list for a specific employee."""
         try:
             # --- Validate employee access ---
-            employee = request.env['hr.employee'].browse(employee_id)
-            if not employee.exists():
-                raise werkzeug.exceptions.NotFound(f"Employee with ID {employee_id} not found.")
+            self._check_employee_exists(employee_id)
 
             # Ensure authenticated user can access this employee's payslips
             # Simple check: user must be linked to the employee requested
@@ -268,30 +443,31 @@ class EssApiController(http.Controller):
             # Add more complex rules for managers/HR if needed
 
             # Search for payslips related to this employee
-            # Filter by state? e.g., state in ['done', 'paid'] ?
+            # Only done/paid slips are listed (_PAYSLIP_DONE_STATES)
             # Add ordering, limit, offset if needed later
-            payslips = request.env['hr.payslip'].search([
+            payslip_rows = request.env['hr.payslip'].search_read([
                 ('employee_id', '=', employee_id),
-                ('state', 'in', ['done', 'paid']) # Example: Only show done/paid slips
-            ], order='date_to desc') # Show most recent first
-
-            payslips_data = []
-            for slip in payslips:
-                # Find the 'NET' line total (this can vary based on payroll rules)
-                net_line = slip.line_ids.filtered(lambda line: line.code == 'NET')
-                net_total = net_line.total if net_line else 0.0
-
-                payslips_data.append({
-                    'id': slip.id,
-                    'month': slip.name, # Payslip name often includes month/year
-                    'total': net_total, # Net wage
-                    'status': slip.state, # e.g., 'draft', 'verify', 'done', 'paid'
-                    # Determine if PDF is downloadable (e.g., based on state)
-                    # Real PDF check would involve looking for report attachment or state
-                    'pdf_available': slip.state in ['done', 'paid'],
-                    'date_from': slip.date_from.strftime('%Y-%m-%d') if slip.date_from else None,
-                    'date_to': slip.date_to.strftime('%Y-%m-%d') if slip.date_to else None,
-                })
+                ('state', 'in', _PAYSLIP_DONE_STATES)
+            ], ['name', 'state', 'date_from', 'date_to'], order='date_to desc') # Show most recent first
+
+            # Fetch the 'NET' line totals of all payslips at once (this can vary based on payroll rules)
+            net_lines = request.env['hr.payslip.line'].search_read([
+                ('slip_id', 'in', [row['id'] for row in payslip_rows]),
+                ('code', '=', 'NET'),
+            ], ['slip_id', 'total'])
+            net_by_slip = {line['slip_id'][0]: line['total'] for line in net_lines}
+
+            payslips_data = [{
+                'id': slip['id'],
+                'month': slip['name'], # Payslip name often includes month/year
+                'total': net_by_slip.get(slip['id'], 0.0), # Net wage
+                'status': slip['state'], # e.g., 'draft', 'verify', 'done', 'paid'
+                # Determine if PDF is downloadable (e.g., based on state)
+                # Real PDF check would involve looking for report attachment or state
+                'pdf_available': slip['state'] in _PAYSLIP_DONE_STATES,
+                'date_from': slip['date_from'] or None, # date objects, serialized as YYYY-MM-DD by _json_response
+                'date_to': slip['date_to'] or None,
+            } for slip in payslip_rows]
 
             return self._json_response(payslips_data)
 
@@ -302,7 +478,7 @@ class EssApiController(http.Controller):
             _logger.warning(f"Forbidden access attempt by user {request.env.user.id} to payslips of employee {employee_id}")
             return self._error_response('Forbidden', str(e), 403)
         except Exception as e:
-            _logger.error(f"Error fetching payslip list for employee {employee_id}: {e}", exc_info=True)
+            _log_unexpected_error(f"Error fetching payslip list for employee {employee_id}: {e}")
             return self._error_response('Internal Server Error', "An unexpected error occurred.", 500)
 
 
@@ -323,29 +499,66 @@ class EssApiController(http.Controller):
             #      raise werkzeug.exceptions.Forbidden("Access Denied: You can only download your own payslips.")
 
             # --- Check if payslip is in a downloadable state ---
-            if payslip.state not in ['done', 'paid']:
+            if payslip.state not in _PAYSLIP_DONE_STATES:
                 raise werkzeug.exceptions.BadRequest("Payslip PDF is not available for download in its current state.")
 
-            # --- Generate and return the PDF ---
-            # Get the standard Odoo payslip report action
-            # This might need adjustment based on your exact payroll setup/report name
-            report_action_name = 'hr_payroll.action_report_payslip'
-            pdf_content, content_type = request.env['ir.actions.report']._render_qweb_pdf(report_action_name, [payslip.id])
+            filename = _FILENAME_RE.sub('_', f"Payslip_{payslip.employee_id.name}_{payslip.number or payslip.name}.pdf")
 
-            if not pdf_content:
-                 _logger.error(f"Failed to generate PDF for payslip ID {payslip_id}.")
-                 raise werkzeug.exceptions.InternalServerError("Failed to generate payslip PDF.")
+            # --- Reuse the stored PDF of a previous download ---
+            # The rendered PDF is kept as an attachment on the payslip, tagged with the payslip's write_date:
+            # a payslip reset and recomputed (done -> cancel -> draft -> done) gets a new PDF, never the old amounts.
+            Attachment = request.env['ir.attachment'].sudo() # Payslip access was already checked above
+            pdf_version = f"{_PAYSLIP_PDF_TAG}{fields.Datetime.to_string(payslip.write_date)}"
+            cached_pdf = Attachment.search([
+                ('res_model', '=', 'hr.payslip'),
+                ('res_id', '=', payslip.id),
+                ('description', '=', pdf_version),
+                ('mimetype', '=', 'application/pdf'),
+            ], order='id desc', limit=1)
 
-            # Prepare HTTP headers for file download
-            filename = f"Payslip_{payslip.employee_id.name}_{payslip.number or payslip.name}.pdf".replace(' ', '_')
             headers = [
                 ('Content-Type', 'application/pdf'),
                 ('Content-Disposition', http.content_disposition(filename)),
-                ('Content-Length', len(pdf_content)) # Add content length
             ]
+            if cached_pdf:
+                _logger.info(f"Serving stored PDF (attachment ID {cached_pdf.id}) for payslip {payslip_id}.")
+                # Same as document downloads: streamed from the local filestore file, else read through 'raw'
+                full_path = cached_pdf._full_path(cached_pdf.store_fname) if cached_pdf.store_fname else None
+                if full_path and os.path.isfile(full_path):
+                    headers.append(('Content-Length', cached_pdf.file_size))
+                    pdf_stream = werkzeug.wsgi.wrap_file(request.httprequest.environ, open(full_path, 'rb'))
+                    return Response(pdf_stream, headers=headers, direct_passthrough=True)
+                pdf_content = cached_pdf.raw
+            else:
+                # --- Generate the PDF ---
+                # Get the standard Odoo payslip report action
+                # This might need adjustment based on your exact payroll setup/report name
+                report_action_name = 'hr_payroll.action_report_payslip'
+                pdf_content, content_type = request.env['ir.actions.report']._render_qweb_pdf(report_action_name, [payslip.id])
+
+                if not pdf_content:
+                     _logger.error(f"Failed to generate PDF for payslip ID {payslip_id}.")
+                     raise werkzeug.exceptions.InternalServerError("Failed to generate payslip PDF.")
+
+                # PDFs stored for an earlier version of the payslip are outdated
+                Attachment.search([
+                    ('res_model', '=', 'hr.payslip'),
+                    ('res_id', '=', payslip.id),
+                    ('description', '=like', f"{_PAYSLIP_PDF_TAG}%"),
+                ]).unlink()
+                Attachment.create({
+                    'name': filename,
+                    'description': pdf_version,
+                    'raw': pdf_content,
+                    'res_model': 'hr.payslip',
+                    'res_id': payslip.id,
+                    'mimetype': 'application/pdf',
+                })
+                _logger.info(f"Successfully generated PDF for payslip {payslip_id} for user {request.env.user.login}.")
 
-            _logger.info(f"Successfully generated PDF for payslip {payslip_id} for user {request.env.user.login}.")
-            return request.make_response(pdf_content, headers=headers)
+            # Already in memory: returned as the response body
+            headers.append(('Content-Length', len(pdf_content)))
+            return Response(pdf_content, headers=headers)
 
         except werkzeug.exceptions.NotFound as e:
              _logger.info(f"Payslip not found for download: ID {payslip_id}.")
@@ -357,7 +570,7 @@ class EssApiController(http.Controller):
              _logger.warning(f"Bad request downloading payslip {payslip_id}: {e}")
              return self._error_response('Bad Request', str(e), 400)
         except Exception as e:
-             _logger.error(f"Error downloading payslip ID {payslip_id}: {e}", exc_info=True)
+             _log_unexpected_error(f"Error downloading payslip ID {payslip_id}: {e}")
              return self._error_response('Internal Server Error', "An unexpected error occurred generating the payslip.", 500)
 
     @route('/ess/api/expenses', type='http', auth='none', methods=['POST'], csrf=False)
@@ -386,17 +599,18 @@ class EssApiController(http.Controller):
             try:
                 employee_id = int(employee_id_str)
                 amount = float(amount_str)
-                expense_date = fields.Date.from_string(date_str)
+                expense_date = date.fromisoformat(date_str)
                 if amount <= 0:
                      raise ValueError("Amount must be positive.")
-            except ValueError as e:
+            except (ValueError, TypeError) as e:
                 _logger.warning(f"Invalid data format in expense payload: {e}")
                 raise werkzeug.exceptions.BadRequest(f"Invalid data format: {e}. Ensure amount is a number and date is YYYY-MM-DD.")
 
             # --- Validate Employee Access ---
-            employee = request.env['hr.employee'].browse(employee_id)
-            if not employee.exists():
+            employee_row = request.env['hr.employee'].search_read([('id', '=', employee_id)], ['company_id'], limit=1)
+            if not employee_row:
                 raise werkzeug.exceptions.NotFound(f"Employee with ID {employee_id} not found.")
+            company_id = employee_row[0]['company_id'][0] if employee_row[0]['company_id'] else False
             # User can only submit for themselves
             # if request.env.user.employee_id != employee:
             #      raise werkzeug.exceptions.Forbidden("You can only submit expenses for yourself.")
@@ -405,11 +619,9 @@ class EssApiController(http.Controller):
             # Odoo expenses require a 'product_id'. Find a default one.
             # Common practice: Use a product configured for expenses, e.g., category 'Can be Expensed'.
             # This logic might need adjustment based on specific Odoo setup.
-            product = request.env['product.product'].search([
-                ('can_be_expensed', '=', True)
-                # Add company filter if needed: ('company_id', 'in', [False, employee.company_id.id])
-            ], limit=1)
-            if not product:
+            # The lookup is cached per company on hr.expense (see models/hr_expense.py).
+            product_id = request.env['hr.expense']._ess_default_expense_product_id(company_id)
+            if not product_id:
                 _logger.error("No default expense product found (product with 'Can be Expensed' checked).")
                 raise werkzeug.exceptions.InternalServerError("Expense product configuration missing in Odoo.")
 
@@ -417,7 +629,7 @@ class EssApiController(http.Controller):
             expense_values = {
                 'name': description,
                 'employee_id': employee_id,
-                'product_id': product.id,
+                'product_id': product_id,
                 # 'unit_amount': amount, # <-- OLD LINE
                 'total_amount': amount,  # <-- NEW LINE - Use total_amount
                 'date': expense_date,
@@ -435,7 +647,7 @@ class EssApiController(http.Controller):
             try:
                 attachment_values = {
                     'name': receipt_file.filename,
-                    'datas': base64.b64encode(receipt_file.read()), # Read file content and encode
+                    'raw': receipt_file.read(), # Raw bytes: skips the base64 encode/decode round-trip of 'datas'
                     'res_model': 'hr.expense',
                     'res_id': expense.id,
                     # 'mimetype': receipt_file.content_type, # Odoo often infers this
@@ -445,7 +657,7 @@ class EssApiController(http.Controller):
                 # expense.message_post(body="Receipt attached.", attachment_ids=[attachment.id])
                 _logger.info(f"Successfully attached receipt {receipt_file.filename} (Attachment ID: {attachment.id}) to Expense ID {expense.id}")
             except Exception as e_att:
-                _logger.error(f"Failed to attach receipt to expense {expense.id}: {e_att}", exc_info=True)
+                _log_unexpected_error(f"Failed to attach receipt to expense {expense.id}: {e_att}")
                 # Should we delete the expense if attachment fails? Or just warn?
                 # For now, let the expense exist but return an error indicating attachment failure.
                 # Consider adding a field to the response indicating attachment status.
@@ -463,7 +675,7 @@ class EssApiController(http.Controller):
 
         # --- Exception Handling ---
         except (exceptions.AccessError) as e:
-             _logger.error(f"Access error submitting expense: {e}", exc_info=True)
+             _logger.warning(f"Access error submitting expense: {e}")
              return self._error_response('Forbidden', f"Permission denied: {e}", 403)
         except (exceptions.UserError, exceptions.ValidationError) as e:
              _logger.error(f"Odoo validation error submitting expense: {e}")
@@ -472,7 +684,7 @@ class EssApiController(http.Controller):
              # Handle specific HTTP exceptions raised intentionally
              return self._error_response(e.name, e.description, e.code)
         except Exception as e:
-             _logger.error(f"Unexpected error ({type(e).__name__}) submitting expense: {e}", exc_info=True)
+             _log_unexpected_error(f"Unexpected error ({type(e).__name__}) submitting expense: {e}")
              return self._error_response('Internal Server Error', 'An unexpected error occurred while submitting the expense.', 500)
 
       # --- GET Pending Leaves Count Endpoint ---
@@ -482,9 +694,7 @@ class EssApiController(http.Controller):
         """Fetches the count of pending leave requests for a specific employee."""
         try:
             # --- Validate employee access ---
-            employee = request.env['hr.employee'].browse(employee_id)
-            if not employee.exists():
-                raise werkzeug.exceptions.NotFound(f"Employee with ID {employee_id} not found.")
+            self._check_employee_exists(employee_id)
 
             # Ensure authenticated user can access this employee's data
             # Simple check: user must be linked to the employee requested
@@ -492,17 +702,11 @@ class EssApiController(http.Controller):
             #      raise werkzeug.exceptions.Forbidden("You can only view your own leave count.")
             # Add more complex rules for managers/HR if needed
 
-            # Define "pending" states for leaves. This might vary based on Odoo workflow.
-            # Common states before final approval: 'confirm' (To Submit by employee), 'to_approve' (Submitted / To Approve by manager)
-            # Some might also consider 'draft' if employees can save drafts they intend to submit.
-            # Check your hr.leave model's 'state' field selection options.
-            pending_states = ['confirm', 'to_approve']
-
             # Count leave requests in pending states for this employee
             # The search_count method is efficient for getting just the count.
             pending_count = request.env['hr.leave'].search_count([
                 ('employee_id', '=', employee_id),
-                ('state', 'in', pending_states)
+                ('state', 'in', _LEAVE_PENDING_STATES)
             ])
 
             _logger.info(f"Pending leave count for employee {employee_id} (User: {request.env.user.login}): {pending_count}")
@@ -516,7 +720,7 @@ class EssApiController(http.Controller):
              _logger.warning(f"Forbidden access attempt by user {request.env.user.id} to pending leaves of employee {employee_id}")
              return self._error_response('Forbidden', str(e), 403)
         except Exception as e:
-             _logger.error(f"Error fetching pending leave count for employee {employee_id}: {e}", exc_info=True)
+             _log_unexpected_error(f"Error fetching pending leave count for employee {employee_id}: {e}")
              return self._error_response('Internal Server Error', "An unexpected error occurred.", 500)      
 
       # --- GET Next Scheduled Day Off Endpoint ---
@@ -525,43 +729,39 @@ class EssApiController(http.Controller):
     def get_next_scheduled_day_off(self, employee_id, **kw):
         """Fetches the date of the next approved future leave for a specific employee."""
         try:
-            # --- Validate employee access ---
-            employee = request.env['hr.employee'].browse(employee_id)
-            if not employee.exists():
-                raise werkzeug.exceptions.NotFound(f"Employee with ID {employee_id} not found.")
-
             # Ensure authenticated user can access this employee's data
             # if request.env.user.employee_id != employee:
             #      raise werkzeug.exceptions.Forbidden("You can only view your own upcoming leave.")
             # Add more complex rules for managers/HR if needed
 
             # --- Find the next approved leave ---
-            # Get today's date in Odoo's format
-            today_date_str = fields.Date.today()
-
-            # Search for approved leaves starting from today onwards
-            # Odoo 'state' for approved leaves is typically 'validate' or 'validate1' then 'validate'.
-            # Check your specific hr.leave workflow for the final approved state name.
-            approved_leave_states = ['validate'] # Adjust if your workflow uses different approved states
+            # Today as a date object (server date, as fields.Date.today())
+            today_date = date.today() # A date object, bound as a DATE parameter
 
-            next_leave = request.env['hr.leave'].search([
+            # Search for approved leaves (_LEAVE_APPROVED_STATES) starting from today onwards.
+            # search_read returns holiday_status_id as (id, name), so this is the only query on the happy path.
+            next_leave = request.env['hr.leave'].search_read([
                 ('employee_id', '=', employee_id),
-                ('state', 'in', approved_leave_states),
-                ('request_date_from', '>=', today_date_str) # Start date is today or in the future
-            ], order='request_date_from asc', limit=1) # Order by start date, take the earliest
+                ('state', 'in', _LEAVE_APPROVED_STATES),
+                ('request_date_from', '>=', today_date) # Start date is today or in the future
+            ], ['request_date_from', 'holiday_status_id', 'name'], order='request_date_from asc', limit=1) # Order by start date, take the earliest
 
             if not next_leave:
+                # Only now check the employee, to tell a 404 apart from "no upcoming leave"
+                self._check_employee_exists(employee_id)
                 _logger.info(f"No upcoming approved leave found for employee {employee_id} (User: {request.env.user.login}).")
                 # Return a specific structure even if no leave is found
                 return self._json_response({'employee_id': employee_id, 'next_day_off': None, 'leave_name': None})
 
             # Prepare data for response
+            next_leave = next_leave[0]
             response_data = {
                 'employee_id': employee_id,
-                'next_day_off': next_leave.request_date_from.strftime('%Y-%m-%d') if next_leave.request_date_from else None,
-                'leave_name': next_leave.holiday_status_id.name or next_leave.name, # Name of the leave type or the leave itself
+                'next_day_off': next_leave['request_date_from'].isoformat() if next_leave['request_date_from'] else None,
+                # Name of the leave type or the leave itself
+                'leave_name': next_leave['holiday_status_id'][1] if next_leave['holiday_status_id'] else next_leave['name'],
                 # Optionally, you could include more details like 'request_date_to'
-                # 'request_date_to': next_leave.request_date_to.strftime('%Y-%m-%d') if next_leave.request_date_to else None,
+                # 'request_date_to': next_leave['request_date_to'].isoformat() if next_leave['request_date_to'] else None,
             }
             _logger.info(f"Next day off for employee {employee_id} (User: {request.env.user.login}): {response_data}")
             return self._json_response(response_data)
@@ -573,9 +773,57 @@ class EssApiController(http.Controller):
              _logger.warning(f"Forbidden access attempt by user {request.env.user.id} to next day off of employee {employee_id}")
              return self._error_response('Forbidden', str(e), 403)
         except Exception as e:
-             _logger.error(f"Error fetching next day off for employee {employee_id}: {e}", exc_info=True)
+             _log_unexpected_error(f"Error fetching next day off for employee {employee_id}: {e}")
              return self._error_response('Internal Server Error', "An unexpected error occurred.", 500)    
 
+    # --- GET Leaves Summary Endpoint (pending count + next day off in one query) ---
+    @route('/ess/api/leaves/summary/<int:employee_id>', type='http', auth='none', methods=['GET'], csrf=False)
+    @api_key_auth(required_model='hr.leave')
+    def get_leaves_summary(self, employee_id, **kw):
+        """
+        Fetches the pending leave count and the next approved day off for an employee
+        with a single grouped query (combines the pending-count and next-off endpoints).
+        """
+        try:
+            # --- Validate employee access ---
+            self._check_employee_exists(employee_id)
+
+            # One GROUP BY state: counts per state and the earliest start date of upcoming approved leaves
+            groups = request.env['hr.leave'].read_group([
+                ('employee_id', '=', employee_id),
+                '|',
+                    ('state', 'in', _LEAVE_PENDING_STATES),
+                    '&',
+                        ('state', 'in', _LEAVE_APPROVED_STATES),
+                        ('request_date_from', '>=', date.today()),
+            ], ['state', 'request_date_from:min'], ['state'])
+
+            pending_count = 0
+            next_day_off = None
+            for group in groups:
+                if group['state'] in _LEAVE_PENDING_STATES:
+                    pending_count += group['state_count']
+                elif group['request_date_from'] and (next_day_off is None or group['request_date_from'] < next_day_off):
+                    next_day_off = group['request_date_from']
+
+            response_data = {
+                'employee_id': employee_id,
+                'pending_leave_count': pending_count,
+                'next_day_off': next_day_off.isoformat() if next_day_off else None,
+            }
+            _logger.info(f"Leaves summary for employee {employee_id} (User: {request.env.user.login}): {response_data}")
+            return self._json_response(response_data)
+
+        except werkzeug.exceptions.NotFound as e:
+             _logger.info(f"Employee not found for leaves summary: {employee_id}.")
+             return self._error_response('Not Found', str(e), 404)
+        except werkzeug.exceptions.Forbidden as e:
+             _logger.warning(f"Forbidden access attempt by user {request.env.user.id} to leaves summary of employee {employee_id}")
+             return self._error_response('Forbidden', str(e), 403)
+        except Exception as e:
+             _log_unexpected_error(f"Error fetching leaves summary for employee {employee_id}: {e}")
+             return self._error_response('Internal Server Error', "An unexpected error occurred.", 500)
+
     # --- GET Today's Attendance Log Endpoint ---
     @route('/ess/api/attendance/today/<int:employee_id>', type='http', auth='none', methods=['GET'], csrf=False)
     @api_key_auth(required_model='hr.attendance')
@@ -583,54 +831,55 @@ class EssApiController(http.Controller):
         """Fetches today's attendance log (check-in/out times) for a specific employee."""
         try:
             # --- Validate employee access ---
-            employee = request.env['hr.employee'].browse(employee_id)
-            if not employee.exists():
-                raise werkzeug.exceptions.NotFound(f"Employee with ID {employee_id} not found.")
+            self._check_employee_exists(employee_id)
 
             # if request.env.user.employee_id != employee:
             #      raise werkzeug.exceptions.Forbidden("You can only view your own attendance log.")
 
             # --- Determine Today's Date Range in UTC ---
             # Get current user's timezone (or company timezone, or Odoo instance timezone as fallback)
-            user_tz_str = request.env.user.tz or request.env.company.resource_calendar_id.tz or 'UTC'
-            user_tz = pytz.timezone(user_tz_str)
+            # User tz is cached per uid; the company calendar is only read for users without a tz
+            user_tz_str = (request.env['res.users']._ess_get_tz_name(request.env.uid)
+                           or request.env.company.resource_calendar_id.tz)
+            user_tz = _get_tz(user_tz_str)
 
-            # Get "today" in the user's timezone
-            today_user_tz = datetime.now(user_tz).date()
+            # Local midnight of "today" in the user's timezone, taken from the aware now()
+            midnight_user_tz = datetime.now(user_tz).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+            today_user_tz = midnight_user_tz.date()
 
-            # Start of today in user's timezone, then convert to UTC for DB query
-            start_of_day_user_tz = user_tz.localize(datetime.combine(today_user_tz, time.min))
-            start_of_day_utc = start_of_day_user_tz.astimezone(pytz.utc).replace(tzinfo=None) # Naive UTC
+            # Start of today in user's timezone, then convert to UTC for DB query (naive UTC)
+            start_of_day_utc = user_tz.localize(midnight_user_tz).astimezone(pytz.utc).replace(tzinfo=None)
 
-            # End of today in user's timezone, then convert to UTC for DB query
-            end_of_day_user_tz = user_tz.localize(datetime.combine(today_user_tz, time.max))
-            end_of_day_utc = end_of_day_user_tz.astimezone(pytz.utc).replace(tzinfo=None) # Naive UTC
+            # Start of tomorrow, as the exclusive upper bound of a half-open [start, next) range. The next
+            # midnight is localized on its own rather than start + 24h, since DST-change days are 23 or 25 hours long.
+            start_of_next_day_utc = (user_tz.localize(midnight_user_tz + timedelta(days=1))
+                                     .astimezone(pytz.utc).replace(tzinfo=None))
 
             _logger.info(f"Fetching attendance for Employee ID {employee_id} for date {today_user_tz} "
-                         f"(UTC range: {start_of_day_utc} to {end_of_day_utc})")
+                         f"(UTC range: [{start_of_day_utc}, {start_of_next_day_utc}))")
 
             # Search for attendance records within this UTC range
             # Odoo stores check_in and check_out as naive UTC datetimes in the DB
-            attendances = request.env['hr.attendance'].search([
+            # search_read: one query returning plain dicts with only the needed columns
+            attendances = request.env['hr.attendance'].search_read([
                 ('employee_id', '=', employee_id),
                 ('check_in', '>=', start_of_day_utc),
-                ('check_in', '<=', end_of_day_utc), # Or check_out <= end_of_day_utc if relevant
-            ], order='check_in asc')
+                ('check_in', '<', start_of_next_day_utc),
+            ], ['check_in', 'check_out', 'worked_hours'], order='check_in asc')
+
+            # Convert UTC datetimes from DB back to user's timezone for display (tz resolved once, not per row)
+            to_local = lambda dt: dt.replace(tzinfo=pytz.utc).astimezone(user_tz)
 
             attendance_log = []
             for att in attendances:
-                # Convert UTC datetimes from DB back to user's timezone for display
-                check_in_user_tz = fields.Datetime.context_timestamp(att, att.check_in).time() if att.check_in else None
-                check_out_user_tz = fields.Datetime.context_timestamp(att, att.check_out).time() if att.check_out else None
-
                 attendance_log.append({
-                    'id': att.id,
-                    'check_in': check_in_user_tz.strftime('%H:%M:%S') if check_in_user_tz else None,
-                    'check_out': check_out_user_tz.strftime('%H:%M:%S') if check_out_user_tz else None,
-                    'worked_hours': round(att.worked_hours, 2) if att.worked_hours else None,
+                    'id': att['id'],
+                    'check_in': to_local(att['check_in']).time().isoformat('seconds') if att['check_in'] else None,
+                    'check_out': to_local(att['check_out']).time().isoformat('seconds') if att['check_out'] else None,
+                    'worked_hours': round(att['worked_hours'], 2) if att['worked_hours'] else None,
                     # Raw UTC values if needed by frontend for further processing
-                    # 'check_in_utc': fields.Datetime.to_string(att.check_in) if att.check_in else None,
-                    # 'check_out_utc': fields.Datetime.to_string(att.check_out) if att.check_out else None,
+                    # 'check_in_utc': fields.Datetime.to_string(att['check_in']) if att['check_in'] else None,
+                    # 'check_out_utc': fields.Datetime.to_string(att['check_out']) if att['check_out'] else None,
                 })
 
             _logger.info(f"Found {len(attendance_log)} attendance records for employee {employee_id} today.")
@@ -641,7 +890,7 @@ class EssApiController(http.Controller):
         except werkzeug.exceptions.Forbidden as e:
              return self._error_response('Forbidden', str(e), 403)
         except Exception as e:
-             _logger.error(f"Error fetching today's attendance log for employee {employee_id}: {e}", exc_info=True)
+             _log_unexpected_error(f"Error fetching today's attendance log for employee {employee_id}: {e}")
              return self._error_response('Internal Server Error', "An unexpected error occurred.", 500)
 
 
@@ -656,65 +905,52 @@ class EssApiController(http.Controller):
         except (werkzeug.exceptions.NotFound, werkzeug.exceptions.Forbidden) as e:
             return self._error_response(e.name, e.description, e.code)
         except Exception as e:
-            _logger.error(f"Error fetching Odoo attendance status for employee {employee_id}: {e}", exc_info=True)
+            _log_unexpected_error(f"Error fetching Odoo attendance status for employee {employee_id}: {e}")
             return self._error_response('Internal Server Error', "Could not retrieve attendance status.", 500)
 
 
-    @route('/ess/api/attendance/check-in', type='http', auth='none', methods=['POST'], csrf=False)
+    @route('/ess/api/attendance/check-in/<int:employee_id>', type='http', auth='none', methods=['POST'], csrf=False)
     @api_key_auth(required_model='hr.attendance')
-    def attendance_check_in(self, **kw): # Expects employee_id in kw or JSON body if type='json'
+    def attendance_check_in(self, employee_id, **kw): # employee_id is validated by the route's int converter
         """Performs a check-in for an employee."""
         try:
-            # For type='http' with POST, data might be in kw or request.params if form-encoded
-            # If expecting JSON, parse it like in submit_leave_request
-            # For simplicity, let's assume employee_id is sent as a form field or query param
-            employee_id_str = kw.get('employee_id') or request.params.get('employee_id')
-            if not employee_id_str:
-                 raise werkzeug.exceptions.BadRequest("Missing 'employee_id' parameter.")
-            employee_id = int(employee_id_str)
-
             employee = self._get_employee_and_validate_access(employee_id)
 
-            # Check current status from hr.attendance
-            current_status_info = self._get_current_odoo_attendance_status(employee_id)
-            if current_status_info.get("status") == "checked_in":
+            # Already checked in = an open attendance exists; existence probe on the partial open-attendance index
+            if request.env['hr.attendance'].search_count([
+                ('employee_id', '=', employee['id']),
+                ('check_out', '=', False),
+            ], limit=1):
                 raise werkzeug.exceptions.BadRequest("User is already checked in according to Odoo attendance records.")
 
             # Create new hr.attendance record
             # Odoo's hr.attendance model often handles setting check_in to now automatically
             new_attendance = request.env['hr.attendance'].create({
-                'employee_id': employee.id,
+                'employee_id': employee['id'],
                 # 'check_in': fields.Datetime.now(), # Odoo might default this
             })
-            _logger.info(f"Employee {employee.name} (ID: {employee.id}) checked IN by user {request.env.user.login}. Attendance ID: {new_attendance.id}")
+            _logger.info(f"Employee {employee['name']} (ID: {employee['id']}) checked IN by user {request.env.user.login}. Attendance ID: {new_attendance.id}")
 
-            # Return the new current status
-            return self._json_response(self._get_current_odoo_attendance_status(employee_id), status=201)
+            # Return the new current status, built from the created record instead of searching again
+            return self._json_response(self._format_attendance_status(new_attendance.check_in, False), status=201)
 
         except (werkzeug.exceptions.NotFound, werkzeug.exceptions.Forbidden, werkzeug.exceptions.BadRequest) as e:
              return self._error_response(e.name, e.description, e.code)
-        except ValueError: # For int(employee_id_str)
-             return self._error_response('Bad Request', "Invalid 'employee_id' format.", 400)
         except Exception as e:
-             _logger.error(f"Error during check-in for employee ID {kw.get('employee_id')}: {e}", exc_info=True)
+             _log_unexpected_error(f"Error during check-in for employee ID {employee_id}: {e}")
              return self._error_response('Internal Server Error', "An unexpected error occurred during check-in.", 500)
 
 
-    @route('/ess/api/attendance/check-out', type='http', auth='none', methods=['POST'], csrf=False)
+    @route('/ess/api/attendance/check-out/<int:employee_id>', type='http', auth='none', methods=['POST'], csrf=False)
     @api_key_auth(required_model='hr.attendance')
-    def attendance_check_out(self, **kw):
+    def attendance_check_out(self, employee_id, **kw):
         """Performs a check-out for an employee."""
         try:
-            employee_id_str = kw.get('employee_id') or request.params.get('employee_id')
-            if not employee_id_str:
-                 raise werkzeug.exceptions.BadRequest("Missing 'employee_id' parameter.")
-            employee_id = int(employee_id_str)
-
             employee = self._get_employee_and_validate_access(employee_id)
 
             # Find the latest open attendance record for the employee
             latest_open_attendance = request.env['hr.attendance'].search([
-                ('employee_id', '=', employee.id),
+                ('employee_id', '=', employee['id']),
                 ('check_out', '=', False), # No check_out time set yet
             ], order='check_in desc', limit=1)
 
@@ -723,24 +959,23 @@ class EssApiController(http.Controller):
 
             # Update the check_out time
             # Odoo's hr.attendance model often handles setting check_out to now automatically on write if empty
+            check_out_time = fields.Datetime.now()
             updated = latest_open_attendance.write({
-                'check_out': fields.Datetime.now()
+                'check_out': check_out_time
             })
             if not updated: # Should not happen if record exists and write is attempted
                 _logger.error(f"Failed to write check_out for attendance ID {latest_open_attendance.id}")
                 raise werkzeug.exceptions.InternalServerError("Failed to update attendance record for check-out.")
 
-            _logger.info(f"Employee {employee.name} (ID: {employee.id}) checked OUT by user {request.env.user.login}. Attendance ID: {latest_open_attendance.id}")
+            _logger.info(f"Employee {employee['name']} (ID: {employee['id']}) checked OUT by user {request.env.user.login}. Attendance ID: {latest_open_attendance.id}")
 
-            # Return the new current status
-            return self._json_response(self._get_current_odoo_attendance_status(employee_id))
+            # Return the new current status from the record just closed instead of searching again
+            return self._json_response(self._format_attendance_status(latest_open_attendance.check_in, check_out_time))
 
         except (werkzeug.exceptions.NotFound, werkzeug.exceptions.Forbidden, werkzeug.exceptions.BadRequest) as e:
              return self._error_response(e.name, e.description, e.code)
-        except ValueError:
-             return self._error_response('Bad Request', "Invalid 'employee_id' format.", 400)
         except Exception as e:
-             _logger.error(f"Error during check-out for employee ID {kw.get('employee_id')}: {e}", exc_info=True)
+             _log_unexpected_error(f"Error during check-out for employee ID {employee_id}: {e}")
              return self._error_response('Internal Server Error', "An unexpected error occurred during check-out.", 500)
 
      # --- NEW: Authenticated Connection Test Endpoint ---
@@ -765,7 +1000,7 @@ class EssApiController(http.Controller):
             return self._json_response(response_data)
 
         except Exception as e: # Should not happen if api_key_auth handles auth errors
-            _logger.error(f"Unexpected error during auth_test after authentication: {e}", exc_info=True)
+            _log_unexpected_error(f"Unexpected error during auth_test after authentication: {e}")
             return self._error_response('Internal Server Error', "An unexpected error occurred during authentication test.", 500)
     # ----------------------------------------------------
 
@@ -792,44 +1027,57 @@ class EssApiController(http.Controller):
                 # For now, let Odoo's record rules + decorator handle this.
                 pass
 
-
-            domain = []
-            if term:
-                term_domain = ['|', '|',
-                    ('name', 'ilike', term),
-                    ('work_email', 'ilike', term),
-                    ('barcode', 'ilike', term) # If you use barcodes for employees
-                ]
-                # If term could be an ID
-                try:
-                    employee_id_from_term = int(term)
-                    term_domain = ['|', ('id', '=', employee_id_from_term)] + term_domain
-                except ValueError:
-                    pass # term is not an integer
-                domain.extend(term_domain)
-            
-            # We only want employees that *can* be linked (e.g., active employees)
-            # domain.append(('active', '=', True)) # Optional: only search active Odoo employees
-
-            employees = request.env['hr.employee'].search(domain, limit=int(limit), order='name asc')
+            if not term:
+                # Nothing to search for: don't return the whole employee table
+                return self._json_response([])
+
+            limit = int(limit)
+            cache_key = (request.db, term.lower(), limit, request.env.user.id)
+            cached_results = _employee_search_cache.get(cache_key)
+            if cached_results is not None:
+                _logger.info(f"Employee search for term '{term}' by user {request.env.user.login} served from cache ({len(cached_results)} results).")
+                return self._json_response(cached_results)
+
+            # search_read returns many2one fields as (id, display_name) pairs, fetched in batch
+            Employee = request.env['hr.employee']
+            employees = []
+            if term.isdigit():
+                # Term could be an ID: direct primary-key lookup, no ilike scan
+                employees = Employee.search_read([('id', '=', int(term))], _EMPLOYEE_SEARCH_FIELDS, limit=1)
+
+            if not employees:
+                # One ilike query per column instead of an OR domain, so each can use its own trigram index.
+                # Each branch returns the ids of its first `limit` rows by (name, id), so their union holds the first
+                # `limit` rows of the OR query; the final read orders them in the database, with its collation
+                # (id breaks ties between equal names, so the cut-offs are deterministic).
+                # barcode: if you use barcodes for employees (numeric terms may be badge numbers)
+                # Optional: add ('active', '=', True) to only search active Odoo employees
+                matched_ids = set()
+                for column in ('name', 'work_email', 'barcode'):
+                    matched_ids.update(Employee.search([(column, 'ilike', term)], limit=limit, order='name asc, id asc').ids)
+                if matched_ids:
+                    employees = Employee.search_read([('id', 'in', list(matched_ids))], _EMPLOYEE_SEARCH_FIELDS,
+                                                     limit=limit, order='name asc, id asc')
 
             results = []
             for emp in employees:
+                job = emp['job_id'] or emp['employee_title']
                 results.append({
-                    'id': emp.id,
-                    'name': emp.name or None,
-                    'work_email': emp.work_email or 'N/A',
-                    'job_title': emp.job_id.name or emp.employee_title.name or 'N/A',
-                    'department': emp.department_id.name or 'N/A',
-                    'work_phone': emp.work_phone or None, # Add work_phone
-                    'mobile_phone': emp.mobile_phone or None, # Add mobile_phone as an alternative
+                    'id': emp['id'],
+                    'name': emp['name'] or None,
+                    'work_email': emp['work_email'] or 'N/A',
+                    'job_title': job[1] if job else 'N/A',
+                    'department': emp['department_id'][1] if emp['department_id'] else 'N/A',
+                    'work_phone': emp['work_phone'] or None, # Add work_phone
+                    'mobile_phone': emp['mobile_phone'] or None, # Add mobile_phone as an alternative
                 })
-            
+            _employee_search_cache.set(cache_key, results)
+
             _logger.info(f"Employee search for term '{term}' by user {request.env.user.login} returned {len(results)} results.")
             return self._json_response(results)
 
         except Exception as e:
-            _logger.error(f"Error during admin employee search for term '{term}': {e}", exc_info=True)
+            _log_unexpected_error(f"Error during admin employee search for term '{term}': {e}")
             return self._error_response('Internal Server Error', "Could not perform employee search.", 500)
 
      # --- POST Document to Employee Endpoint ---
@@ -843,14 +1091,12 @@ class EssApiController(http.Controller):
         """
         try:
             # --- Validate Employee Access ---
-            # The _get_employee_and_validate_access helper can be reused or adapted
+            # The _get_employee_and_validate_access helper is reused here.
             # It checks if employee exists and if current API user can access/modify this employee.
             # For attaching a document, the API user might need write access on hr.employee (to link attachment)
             # or create access on ir.attachment with the ability to set res_id and res_model.
             # Let's assume for now the API user (e.g. admin) has sufficient rights.
-            employee = request.env['hr.employee'].browse(employee_id)
-            if not employee.exists():
-                raise werkzeug.exceptions.NotFound(f"Employee with ID {employee_id} not found.")
+            employee = self._get_employee_and_validate_access(employee_id)
 
             # Ensure the authenticated user (via token) has rights to attach documents to this employee.
             # This might involve checking if request.env.user is the employee themselves, their manager, or an HR admin.
@@ -870,37 +1116,39 @@ class EssApiController(http.Controller):
             if not uploaded_file or not uploaded_file.filename:
                 raise werkzeug.exceptions.BadRequest("Missing 'file' for upload or file has no name.")
 
-            _logger.info(
-                f"User {request.env.user.login} uploading document type '{document_type}' "
-                f"for employee {employee.name} (ID: {employee.id}). File: {uploaded_file.filename}"
-            )
-
-            # --- File Validation (Optional, but good practice) ---
-            # Example: check file type based on content_type or extension
-            allowed_mimetypes = ['application/pdf', 'image/jpeg', 'image/png']
-            if uploaded_file.content_type not in allowed_mimetypes:
+            # --- File Validation (fail fast, before the content is read into memory) ---
+            if uploaded_file.content_type not in _ALLOWED_UPLOAD_MIMETYPES:
                 raise werkzeug.exceptions.BadRequest(
                     f"Invalid file type: {uploaded_file.content_type}. Allowed: PDF, JPG, PNG."
                 )
-            # Example: check file size (request.httprequest.content_length for total size)
-            # File size check for individual files in multipart is more complex here,
-            # often better handled by the client or a middleware if Odoo doesn't enforce it early.
+            # Size from the spooled upload stream, without reading it
+            uploaded_file.stream.seek(0, io.SEEK_END)
+            file_size = uploaded_file.stream.tell()
+            uploaded_file.stream.seek(0)
+            if file_size > _MAX_UPLOAD_BYTES:
+                raise werkzeug.exceptions.RequestEntityTooLarge(
+                    f"File is too large ({file_size} bytes). Maximum allowed size is {_MAX_UPLOAD_BYTES // (1024 * 1024)} MB."
+                )
 
+            _logger.info(
+                f"User {request.env.user.login} uploading document type '{document_type}' "
+                f"for employee {employee['name']} (ID: {employee['id']}). File: {uploaded_file.filename} ({file_size} bytes)"
+            )
 
             # --- Create ir.attachment record ---
             file_content = uploaded_file.read()
             attachment_vals = {
                 'name': uploaded_file.filename,        # Name of the attachment
-                'datas': base64.b64encode(file_content), # File content, base64 encoded
+                'raw': file_content,                    # Raw file bytes (no base64 round-trip)
                 'res_model': 'hr.employee',             # Link to the hr.employee model
-                'res_id': employee.id,                  # Link to the specific employee record ID
+                'res_id': employee['id'],               # Link to the specific employee record ID
                 'description': document_type,           # Use document_type as description
                 'mimetype': uploaded_file.content_type,
                 # 'company_id': employee.company_id.id, # Optional: if multi-company and attachments are company-specific
             }
             
             attachment = request.env['ir.attachment'].create(attachment_vals)
-            _logger.info(f"Attachment ID {attachment.id} ({attachment.name}) created and linked to Employee ID {employee.id}.")
+            _logger.info(f"Attachment ID {attachment.id} ({attachment.name}) created and linked to Employee ID {employee['id']}.")
 
             # Optional: Post a message in the employee's chatter
             # employee.message_post(body=f"Document '{document_type}: {attachment.name}' uploaded.")
@@ -910,21 +1158,22 @@ class EssApiController(http.Controller):
                 'attachment_id': attachment.id,
                 'filename': attachment.name,
                 'document_type': document_type,
-                'employee_id': employee.id
+                'employee_id': employee['id']
             }
             return self._json_response(response_data, status=201) # 201 Created
 
         except (exceptions.AccessError) as e: # Catch Odoo's AccessError
-             _logger.error(f"Access error uploading document for employee {employee_id}: {e}", exc_info=True)
+             _logger.warning(f"Access error uploading document for employee {employee_id}: {e}")
              return self._error_response('Forbidden', f"Permission denied: {e}", 403)
         except (exceptions.UserError, exceptions.ValidationError) as e: # Odoo's business logic errors
              _logger.error(f"Odoo validation error uploading document for employee {employee_id}: {e}")
              return self._error_response('Validation Error', str(e), 400)
-        except (werkzeug.exceptions.NotFound, werkzeug.exceptions.Forbidden, werkzeug.exceptions.BadRequest) as e:
+        except (werkzeug.exceptions.NotFound, werkzeug.exceptions.Forbidden, werkzeug.exceptions.BadRequest,
+                werkzeug.exceptions.RequestEntityTooLarge) as e:
              _logger.warning(f"HTTP error ({e.code}) uploading document for employee {employee_id}: {e.description}")
              return self._error_response(e.name, e.description, e.code)
         except Exception as e:
-             _logger.error(f"Unexpected error uploading document for employee {employee_id}: {e}", exc_info=True)
+             _log_unexpected_error(f"Unexpected error uploading document for employee {employee_id}: {e}")
              return self._error_response('Internal Server Error', "An unexpected error occurred during document upload.", 500)
 
     @route('/ess/api/employee/<int:employee_id>/documents', type='http', auth='none', methods=['GET'], csrf=False)
@@ -934,29 +1183,28 @@ class EssApiController(http.Controller):
         try:
             employee = self._get_employee_and_validate_access(employee_id) # Reuses existing helper
 
-            attachments = request.env['ir.attachment'].search([
+            attachments = request.env['ir.attachment'].search_read([
                 ('res_model', '=', 'hr.employee'),
-                ('res_id', '=', employee.id),
+                ('res_id', '=', employee['id']),
                 # Optional: Add further filtering, e.g., by a specific tag or uploader if needed
-            ], order='create_date desc')
-
-            documents_data = []
-            for att in attachments:
-                documents_data.append({
-                    'id': att.id, # This is the ir.attachment ID
-                    'filename': att.name,
-                    'document_type': att.description or 'N/A', # We stored doc type in description
-                    'upload_date': fields.Datetime.to_string(att.create_date), # create_date is already UTC
-                    'mimetype': att.mimetype,
-                    'size': att.file_size, # Human-readable size
-                })
+            ], ['name', 'description', 'create_date', 'mimetype', 'file_size'], order='create_date desc')
+
+            documents_data = [{
+                'id': att['id'], # This is the ir.attachment ID
+                'filename': att['name'],
+                'document_type': att['description'] or 'N/A', # We stored doc type in description
+                # create_date is already UTC; same 'YYYY-MM-DD HH:MM:SS' string as fields.Datetime.to_string
+                'upload_date': att['create_date'].isoformat(sep=' ', timespec='seconds') if att['create_date'] else False,
+                'mimetype': att['mimetype'],
+                'size': att['file_size'], # Human-readable size
+            } for att in attachments]
             _logger.info(f"Found {len(documents_data)} documents for employee {employee_id} (User: {request.env.user.login}).")
             return self._json_response(documents_data)
 
         except (werkzeug.exceptions.NotFound, werkzeug.exceptions.Forbidden) as e:
             return self._error_response(e.name, e.description, e.code)
         except Exception as e:
-            _logger.error(f"Error fetching documents for employee {employee_id}: {e}", exc_info=True)
+            _log_unexpected_error(f"Error fetching documents for employee {employee_id}: {e}")
             return self._error_response('Internal Server Error', "Could not retrieve documents.", 500)
 
 
@@ -965,99 +1213,111 @@ class EssApiController(http.Controller):
     def download_employee_document_attachment(self, attachment_id, **kw):
         """Downloads a specific ir.attachment, ensuring it belongs to the user's employee."""
         try:
-            attachment = request.env['ir.attachment'].browse(attachment_id)
-            if not attachment.exists() or attachment.res_model != 'hr.employee':
+            # One search in the API user's context: ir.attachment's _search only returns attachments whose
+            # hr.employee record still exists and is readable by the user, so no separate employee check is needed
+            attachment = request.env['ir.attachment'].search([
+                ('id', '=', attachment_id),
+                ('res_model', '=', 'hr.employee'),
+            ], limit=1)
+            if not attachment:
                 raise werkzeug.exceptions.NotFound("Document (attachment) not found or not an employee document.")
 
-            # Validate employee access for this attachment
-            # The attachment's res_id should be the employee_id
-            employee_id_of_attachment = attachment.res_id
-            self._get_employee_and_validate_access(employee_id_of_attachment) # Checks if current API user can access this employee
-
-            if not attachment.datas: # Check if there is file content
-                raise werkzeug.exceptions.NotFound("Document content not found for this attachment.")
+            # Stream the content instead of base64-decoding it into memory: attachments in the local filestore
+            # are served from their file. Anything else (DB storage, or a storage override such as an object store
+            # where store_fname is not a local file) goes through 'raw', which honours the attachment's storage.
+            full_path = attachment._full_path(attachment.store_fname) if attachment.store_fname else None
+            if full_path and os.path.isfile(full_path):
+                file_obj = open(full_path, 'rb')
+            else:
+                raw_content = attachment.raw
+                if not raw_content: # Check if there is file content
+                    raise werkzeug.exceptions.NotFound("Document content not found for this attachment.")
+                file_obj = io.BytesIO(raw_content)
 
-            # Decode base64 data
-            file_content = base64.b64decode(attachment.datas)
-            
             headers = [
                 ('Content-Type', attachment.mimetype or 'application/octet-stream'),
                 ('Content-Disposition', http.content_disposition(attachment.name)),
-                ('Content-Length', len(file_content))
+                ('Content-Length', attachment.file_size)
             ]
             _logger.info(f"User {request.env.user.login} downloading attachment ID {attachment.id} ({attachment.name}).")
-            return request.make_response(file_content, headers=headers)
+            file_stream = werkzeug.wsgi.wrap_file(request.httprequest.environ, file_obj)
+            return Response(file_stream, headers=headers, direct_passthrough=True)
 
         except (werkzeug.exceptions.NotFound, werkzeug.exceptions.Forbidden) as e:
             return self._error_response(e.name, e.description, e.code)
         except Exception as e:
-            _logger.error(f"Error downloading attachment ID {attachment_id}: {e}", exc_info=True)
+            _log_unexpected_error(f"Error downloading attachment ID {attachment_id}: {e}")
             return self._error_response('Internal Server Error', "Could not download document.", 500)
 
 
-    # --- DELETE Specific Document (Attachment) from Odoo ---
-    @route('/ess/api/attachment/<int:attachment_id>', type='http', auth='none', methods=['DELETE'], csrf=False)
+    # --- DELETE Specific Document(s) (Attachments) from Odoo ---
+    # Single: DELETE /ess/api/attachment/<id>; batch: DELETE /ess/api/attachments?attachment_ids=1,2,3
+    @route(['/ess/api/attachment/<int:attachment_id>', '/ess/api/attachments'],
+           type='http', auth='none', methods=['DELETE'], csrf=False)
     @api_key_auth(required_model='ir.attachment') # Scope check for ir.attachment
-    def delete_employee_document_attachment(self, attachment_id, **kw):
-        """Deletes a specific ir.attachment, ensuring it belongs to the user's employee."""
+    def delete_employee_document_attachment(self, attachment_id=None, attachment_ids=None, **kw):
+        """
+        Deletes one or several ir.attachment records, ensuring they are employee documents the user can access.
+        All requested attachments are checked first and removed with a single unlink (all or nothing).
+        """
         try:
-            # Find the attachment using sudo to check its properties first,
-            # actual unlink will be done with user context if possible or sudo if needed by policy.
-            attachment = request.env['ir.attachment'].sudo().browse(attachment_id)
-            if not attachment.exists():
-                raise werkzeug.exceptions.NotFound("Document (attachment) to delete not found.")
-
-            # --- Validate Ownership and Model ---
-            if attachment.res_model != 'hr.employee':
-                # This check might be redundant if your listing endpoint only shows hr.employee attachments
-                raise werkzeug.exceptions.Forbidden("This attachment is not an employee document.")
-
-            # The employee ID linked to this attachment
-            attached_employee_id = attachment.res_id
-
-            # Use the helper to validate if the current API user can act on this employee's data
-            # This also sets request.env.user to the API token's user
-            target_employee = self._get_employee_and_validate_access(attached_employee_id)
-            # _get_employee_and_validate_access already raises Forbidden if the API user (e.g. admin)
-            # cannot access this employee, or if the API user is an employee but not this one.
+            if attachment_id:
+                requested_ids = {attachment_id}
+            else:
+                try:
+                    requested_ids = {int(att_id) for att_id in (attachment_ids or '').split(',') if att_id.strip()}
+                except ValueError:
+                    raise werkzeug.exceptions.BadRequest("'attachment_ids' must be a comma-separated list of integers.")
+                if not requested_ids:
+                    raise werkzeug.exceptions.BadRequest("Missing 'attachment_ids' parameter.")
+
+            # One search in the API user's context: ir.attachment's _search only returns attachments whose
+            # hr.employee record still exists and is readable by the user (record rules included),
+            # which replaces the sudo browse + employee validation + re-browse.
+            attachments_to_delete = request.env['ir.attachment'].search([
+                ('id', 'in', list(requested_ids)),
+                ('res_model', '=', 'hr.employee'),
+            ])
+            missing_ids = requested_ids - set(attachments_to_delete.ids)
+            if missing_ids:
+                raise werkzeug.exceptions.NotFound(
+                    f"Document (attachment) to delete not found or not an employee document: {sorted(missing_ids)}.")
 
             _logger.info(
-                f"User {request.env.user.login} attempting to delete attachment ID {attachment.id} "
-                f"({attachment.name}) linked to Employee ID {target_employee.id}."
+                f"User {request.env.user.login} attempting to delete attachment IDs {attachments_to_delete.ids} "
+                f"linked to Employee IDs {sorted(set(attachments_to_delete.mapped('res_id')))}."
             )
 
-            # Perform the delete operation.
-            # request.env['ir.attachment'] will now operate with the permissions of request.env.user
-            # If request.env.user (the one from the token) has unlink rights on ir.attachment
-            # (especially those linked to hr.employee based on record rules or group), this will work.
-            # If not, you might need to use .sudo() for the unlink operation,
-            # but only if your business logic absolutely allows the API user to delete any attachment
-            # for an employee they can access.
+            # Perform the delete operation with the permissions of request.env.user (the token's user).
             # For ESS, usually the employee themselves should be able to delete their own docs.
-            # If the token user is the employee themselves, this should work fine if they have unlink rights.
-            attachment_to_delete = request.env['ir.attachment'].browse(attachment.id) # Re-browse in current user context
-            if not attachment_to_delete.check_access_rights('unlink', raise_exception=False):
-                _logger.warning(f"User {request.env.user.login} lacks unlink permission on ir.attachment ID {attachment.id}. Trying with sudo based on ownership.")
+            # Model-level right: checked once for the whole batch.
+            if not attachments_to_delete.check_access_rights('unlink', raise_exception=False):
+                _logger.warning(f"User {request.env.user.login} lacks unlink permission on ir.attachment IDs {attachments_to_delete.ids}.")
                 # Fallback to sudo only if it's confirmed it's their own document,
                 # or if the API user is a privileged one. For ESS, if the user from token is the employee,
                 # they should have rights or this is a flaw.
                 # For now, let's be strict: if they don't have direct rights, it fails.
                 # This encourages setting up Odoo permissions correctly.
                 # If you decide the API user *always* deletes, then use:
-                # attachment.sudo().unlink()
+                # attachments_to_delete.sudo().unlink()
                 raise werkzeug.exceptions.Forbidden("You do not have permission to delete this specific document.")
 
 
-            attachment_to_delete.unlink()
-            _logger.info(f"Successfully deleted attachment ID {attachment_id}.")
+            deleted_ids = attachments_to_delete.ids
+            attachments_to_delete.unlink() # One DELETE for the whole batch
+            _logger.info(f"Successfully deleted attachment IDs {deleted_ids}.")
 
-            return self._json_response({'message': 'Document deleted successfully.'}, status=200) # Or 204 No Content
+            response_data = {'message': 'Document deleted successfully.' if len(deleted_ids) == 1
+                             else f'{len(deleted_ids)} documents deleted successfully.'}
+            if not attachment_id:
+                response_data['deleted_ids'] = deleted_ids
+            return self._json_response(response_data, status=200) # Or 204 No Content
 
         except (werkzeug.exceptions.NotFound, werkzeug.exceptions.Forbidden, werkzeug.exceptions.BadRequest) as e:
             return self._error_response(e.name, e.description, e.code)
         except exceptions.AccessError as e: # Catch Odoo's own access errors
-            _logger.error(f"Odoo AccessError deleting attachment ID {attachment_id}: {e}", exc_info=True)
+            _logger.warning(f"Odoo AccessError deleting attachment ID(s) {attachment_id or attachment_ids}: {e}")
             return self._error_response('Forbidden', str(e), 403)
         except Exception as e:
-            _logger.error(f"Error deleting attachment ID {attachment_id}: {e}", exc_info=True)
+            _log_unexpected_error(f"Error deleting attachment ID(s) {attachment_id or attachment_ids}: {e}")
             return self._error_response('Internal Server Error', "Could not delete document.", 500)
\ No newline at end of file
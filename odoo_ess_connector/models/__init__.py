@@ -3,5 +3,13 @@
 # from . import ess_api_log
 # -*- coding: utf-8 -*-
 from . import ess_api_token
+from . import ess_api_token_reveal
 from . import ess_api_log  # Import the new model file
-from . import res_config_settings
\ No newline at end of file
+from . import res_config_settings
+from . import hr_expense
+from . import product_template
+from . import product_product
+from . import res_users
+from . import hr_attendance
+from . import hr_leave
+from . import hr_employee
@@ -1,5 +1,53 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api
+import atexit
+import collections
+import io
+import logging
+import threading
+import time
+import psycopg2
+from psycopg2.extras import execute_values
+from odoo import models, fields, api, SUPERUSER_ID
+from odoo.modules.registry import Registry
+
+_logger = logging.getLogger(__name__)
+
+# Buffered writer: API log rows are queued in memory per database and inserted with one create(vals_list).
+# Defaults for the res.config.settings parameters (see ResConfigSettings.ess_log_buffer_*).
+AUDIT_TRAIL_BUFFER_MAX_SIZE = 100 # Rows queued before a flush is triggered
+AUDIT_TRAIL_BUFFER_FLUSH_INTERVAL = 30 # Seconds after which queued rows are flushed on the next API call
+ESS_LOG_LEVEL = 'writes_only' # Default for the 'ess_log_level' setting: 'all', 'writes_only' or 'failures_only'
+_WRITE_METHODS = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+ESS_LOG_RETENTION_DAYS = 90 # Default for the 'ess_log_retention_days' setting ('ess_log_keep_forever' disables the cleanup)
+_COPY_MIN_ROWS = 200 # Flushes of at least this many rows use COPY ... FROM STDIN instead of a multi-row INSERT
+# Columns written by _insert_buffered_rows, besides the create/write uid/date log columns
+_LOG_COLUMNS = ('user_id', 'api_token_id', 'endpoint', 'method', 'request_ip',
+                'response_status_code', 'message', 'duration_ms')
+# Errors caused by a row's values (psycopg2 raises ValueError itself for strings with NUL bytes). Other errors,
+# e.g. a lost connection, propagate so that _flush_buffer re-queues the whole batch.
+_BAD_ROW_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError, ValueError)
+_RETENTION_DELETE_BATCH = 10000 # Rows deleted per statement (and transaction) by _gc_old_logs
+
+_buffer_lock = threading.Lock()
+_buffers = collections.defaultdict(collections.deque) # dbname -> deque of pending log vals
+_last_flush = {} # dbname -> time.monotonic() of the last flush
+_flush_scheduled = set() # dbnames with a flush already requested
+# dbname -> (max_size, flush_interval, log_level), refreshed from ir.config_parameter on each flush
+# (and when the settings are saved) so that buffering a row never needs a query
+_buffer_settings = {}
+
+
+def _copy_csv_field(value):
+    """
+    Formats one value for COPY ... WITH (FORMAT csv, NULL '\\N'): None is the unquoted NULL marker,
+    strings are always quoted (a quoted field is never read as NULL, so '' and a literal \\N stay text).
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, str):
+        return '"%s"' % value.replace('"', '""')
+    return str(value)
+
 
 class EssApiLog(models.Model):
     _name = 'ess.api.log'
@@ -7,7 +55,7 @@ class EssApiLog(models.Model):
     _order = 'create_date desc' # Show newest logs first
 
     # --- Fields Definition ---
-    create_date = fields.Datetime(string="Timestamp", readonly=True, default=fields.Datetime.now)
+    create_date = fields.Datetime(string="Timestamp", readonly=True, default=fields.Datetime.now, index=True) # Retention cleanup + newest-first order
     user_id = fields.Many2one(
         'res.users',
         string='Authenticated User',
@@ -55,4 +103,166 @@ class EssApiLog(models.Model):
         help="Time taken by Odoo to process the request (controller execution)."
     )
 
-    # No methods needed for this model initially, it's primarily for data storage.
\ No newline at end of file
+    # --- Buffered Writer ---
+    @api.model
+    def _buffer_log(self, vals):
+        """
+        Queues an API log row for this database without touching the DB, unless the 'ess_log_level'
+        setting skips it (read-only calls for 'writes_only', successful calls for 'failures_only').
+        Returns True when the caller should trigger _flush_buffer (size threshold reached or
+        flush interval elapsed) and no flush is already pending. Skipped rows still report an elapsed
+        interval, so the cached settings keep being refreshed.
+        """
+        dbname = self.env.cr.dbname
+        max_size, flush_interval, log_level = _buffer_settings.get(
+            dbname, (AUDIT_TRAIL_BUFFER_MAX_SIZE, AUDIT_TRAIL_BUFFER_FLUSH_INTERVAL, ESS_LOG_LEVEL))
+        failed = (vals.get('response_status_code') or 0) >= 400
+        keep = (log_level == 'all'
+                or (log_level == 'writes_only' and (vals.get('method') in _WRITE_METHODS or failed))
+                or (log_level == 'failures_only' and failed))
+        now = time.monotonic()
+        with _buffer_lock:
+            buffer = _buffers[dbname]
+            if keep:
+                # Stamped now: the row is only inserted at the next flush
+                vals.setdefault('create_date', fields.Datetime.now())
+                buffer.append(vals)
+            last_flush = _last_flush.setdefault(dbname, now)
+            if dbname in _flush_scheduled:
+                return False
+            if len(buffer) >= max_size or now - last_flush >= flush_interval:
+                _flush_scheduled.add(dbname)
+                return True
+        return False
+
+    @api.model
+    def _flush_buffer(self):
+        """
+        Inserts all queued log rows of this database in a single statement and refreshes the
+        buffer settings. Called from a background cursor, the ir.cron and the autovacuum.
+        The rows are committed here: if the insert or the commit fails, they are put back at the front
+        of the buffer for the next flush instead of being lost. Returns the number of rows written.
+        """
+        dbname = self.env.cr.dbname
+        settings = self._read_buffer_settings()
+        with _buffer_lock:
+            _buffer_settings[dbname] = settings
+            _last_flush[dbname] = time.monotonic()
+            _flush_scheduled.discard(dbname)
+            pending = _buffers.pop(dbname, None)
+        if not pending:
+            return 0
+        try:
+            self._insert_buffered_rows(pending)
+            self.env.cr.commit()
+        except Exception:
+            with _buffer_lock:
+                _buffers[dbname].extendleft(reversed(pending)) # Keeps the original order
+            raise
+        _logger.info(f"Flushed {len(pending)} buffered API log entries.")
+        return len(pending)
+
+    @api.model
+    def _insert_buffered_rows(self, rows):
+        """
+        Writes buffered log vals with one SQL statement: a multi-row INSERT, or COPY FROM STDIN for bursts
+        of _COPY_MIN_ROWS rows or more. Plain SQL (this model has no computed fields or side effects) also keeps
+        each row's create_date, which the ORM would overwrite with the flush time. 'id' comes from its sequence.
+        If the batch statement fails on a rejected value (_BAD_ROW_ERRORS), the rows are inserted one by one so
+        only the offending rows are skipped, instead of the whole batch being lost or re-queued forever.
+        """
+        uid = self.env.uid
+        columns = ', '.join(('create_uid', 'create_date', 'write_uid', 'write_date') + _LOG_COLUMNS)
+        records = [
+            (uid, vals['create_date'], uid, vals['create_date']) + tuple(vals.get(column) for column in _LOG_COLUMNS)
+            for vals in rows
+        ]
+        try:
+            with self.env.cr.savepoint(flush=False):
+                if len(records) >= _COPY_MIN_ROWS:
+                    # None and '' are written distinctly (see _copy_csv_field), so rows match the INSERT path exactly
+                    buffer = io.StringIO(''.join(','.join(map(_copy_csv_field, record)) + '\n' for record in records))
+                    self.env.cr.copy_expert(f"COPY ess_api_log ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+                else:
+                    execute_values(self.env.cr, f"INSERT INTO ess_api_log ({columns}) VALUES %s", records)
+            return
+        except _BAD_ROW_ERRORS as batch_e:
+            _logger.warning(f"Batch insert of {len(records)} API log entries failed ({batch_e}), inserting them one by one.")
+        placeholders = ', '.join(['%s'] * len(records[0]))
+        for record in records:
+            try:
+                with self.env.cr.savepoint(flush=False):
+                    self.env.cr.execute(f"INSERT INTO ess_api_log ({columns}) VALUES ({placeholders})", record)
+            except _BAD_ROW_ERRORS as row_e:
+                _logger.error(f"CRITICAL: Dropping API log entry for {record[7]} {record[6]}: {row_e}")
+
+    @api.model
+    def _read_buffer_settings(self):
+        """Returns the (max_size, flush_interval, log_level) buffer settings of this database."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        return (
+            int(IrConfigParameter.get_param('odoo_ess_connector.log_buffer_max_size') or AUDIT_TRAIL_BUFFER_MAX_SIZE),
+            int(IrConfigParameter.get_param('odoo_ess_connector.log_buffer_flush_interval') or AUDIT_TRAIL_BUFFER_FLUSH_INTERVAL),
+            IrConfigParameter.get_param('odoo_ess_connector.ess_log_level') or ESS_LOG_LEVEL,
+        )
+
+    @api.model
+    def _refresh_buffer_settings(self):
+        """Reloads the cached buffer settings of this database (called when the settings are saved)."""
+        settings = self._read_buffer_settings()
+        with _buffer_lock:
+            _buffer_settings[self.env.cr.dbname] = settings
+
+    @api.autovacuum
+    def _gc_flush_buffer(self):
+        """Force-flushes the log buffer of this process during the daily autovacuum."""
+        self._flush_buffer()
+
+    @api.autovacuum
+    def _gc_old_logs(self):
+        """
+        Deletes log entries older than the 'ess_log_retention_days' setting (daily autovacuum), unless
+        'ess_log_keep_forever' is set. A 0 retention cannot be stored (settings drop falsy integer parameters,
+        so it reads back as the default), hence the separate Boolean.
+        Deleted by create_date range in batches, each committed, so a large backlog never holds one huge transaction.
+        """
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        if IrConfigParameter.get_param('odoo_ess_connector.log_keep_forever'):
+            return
+        retention_days = int(IrConfigParameter.get_param(
+            'odoo_ess_connector.log_retention_days') or ESS_LOG_RETENTION_DAYS)
+        if retention_days <= 0:
+            return
+        cutoff = fields.Datetime.subtract(fields.Datetime.now(), days=retention_days)
+        deleted = 0
+        while True:
+            self.env.cr.execute("""
+                DELETE FROM ess_api_log
+                 WHERE id IN (SELECT id FROM ess_api_log WHERE create_date < %s LIMIT %s)
+            """, (cutoff, _RETENTION_DELETE_BATCH))
+            deleted += self.env.cr.rowcount
+            if self.env.cr.rowcount < _RETENTION_DELETE_BATCH:
+                break
+            self.env.cr.commit()
+        if deleted:
+            _logger.info(f"Deleted {deleted} ESS API log entries older than {retention_days} days.")
+
+
+def flush_log_buffer_in_new_cursor(dbname):
+    """
+    Flushes the API log buffer of a database in its own cursor (committed on exit).
+    Used by the API decorator's background executor and at process exit.
+    """
+    try:
+        with Registry(dbname).cursor() as cr:
+            api.Environment(cr, SUPERUSER_ID, {})['ess.api.log']._flush_buffer()
+    except Exception as log_e:
+        _logger.error(f"CRITICAL: Failed to flush buffered API log entries for database {dbname}: {log_e}", exc_info=True)
+
+
+@atexit.register
+def _flush_all_log_buffers():
+    """Writes the log rows still buffered in this process on server shutdown."""
+    for dbname in list(_buffers):
+        if _buffers[dbname]:
+            flush_log_buffer_in_new_cursor(dbname)
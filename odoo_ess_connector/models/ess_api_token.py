@@ -1,10 +1,49 @@
 # -*- coding: utf-8 -*-
+import atexit
+import base64
+import collections
+import concurrent.futures
+import hashlib
 import secrets
 import logging # Import logging for _logger
-from odoo import models, fields, api, exceptions, _
+import math
+import os
+import re
+import threading
+import time
+from psycopg2.extras import execute_values
+from odoo import models, fields, api, exceptions, tools, SUPERUSER_ID, _
+from odoo.modules.registry import Registry
+from ..rate_limit import TokenBucket
 
 _logger = logging.getLogger(__name__) # Initialize logger for this model
 
+# 'last_used' updates are coalesced in memory ({token_id: latest timestamp} per database) and written
+# in one UPDATE at most every _LAST_USED_FLUSH_INTERVAL seconds, instead of one cursor + commit per API call.
+_LAST_USED_FLUSH_INTERVAL = 10 # seconds
+_last_used_lock = threading.Lock()
+_LAST_USED_PENDING = collections.defaultdict(dict) # dbname -> {token_id: datetime}
+_last_used_flushed_at = {} # dbname -> time.monotonic() of the last flush
+# The due flush runs in the background so token validation never waits on its cursor and commit.
+_LAST_USED_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='ess-last-used')
+
+# Per-token rate limiting: token buckets kept in process memory, {(dbname, token_id): TokenBucket}.
+# Defaults for the res.config.settings parameters (see ResConfigSettings.ess_rate_limit_*); capacity 0 disables it.
+# Disabled by default: the ESS Portal backend calls the API with a single token for the whole tenant.
+ESS_RATE_LIMIT_CAPACITY = 0 # Burst size (requests)
+ESS_RATE_LIMIT_REFILL_PER_SEC = 10 # Sustained requests per second
+_rate_limit_lock = threading.Lock()
+_rate_limit_buckets = {}
+
+# Tokens issued by this module are secrets.token_urlsafe(32) (43 URL-safe characters), but imported or
+# scripted tokens may be any string. Only values no token can be (empty, whitespace or non-ASCII
+# characters, oversized) are rejected before any cache or SQL lookup.
+_TOKEN_RE = re.compile(r'\A[!-~]{1,256}\Z')
+
+def hash_token(token_str):
+    """Returns the hex SHA-256 digest under which a token is stored (the plaintext is never stored)."""
+    return hashlib.sha256(token_str.encode('utf-8')).hexdigest()
+
 class EssApiToken(models.Model):
     _name = 'ess.api.token'
     _description = 'ESS API Access Token'
@@ -24,11 +63,12 @@ class EssApiToken(models.Model):
         ondelete='cascade', # Good practice: delete tokens if the user is deleted
         help="The Odoo user this token will act on behalf of for API calls."
     )
-    token = fields.Char(
-        string='API Token', # Changed string for clarity
+    token_hash = fields.Char(
+        string='API Token Hash',
         readonly=True, # Token should not be manually editable after creation
         copy=False,    # Prevent copying the token value to new records
-        help="The unique API access token. Generated automatically on creation."
+        help="SHA-256 digest of the API access token. The token itself is not stored: "
+             "it is shown once, when generated with 'Generate New Token'."
     )
     scope = fields.Char(
         string='Scope (Optional)',
@@ -39,6 +79,13 @@ class EssApiToken(models.Model):
         default=True,
         help="If unchecked, this token will be disabled and cannot be used for authentication."
     )
+    token_revealed = fields.Boolean(
+        string='Token Shown',
+        readonly=True,
+        copy=False,
+        help="Whether the token value has been made known: supplied on creation, or shown by 'Save & Show Token' "
+             "or 'Generate New Token'. A token generated by a plain save is never displayed."
+    )
     last_used = fields.Datetime(
         string='Last Used On', # Changed string for clarity
         readonly=True,
@@ -51,37 +98,83 @@ class EssApiToken(models.Model):
 
     # --- SQL Constraints ---
     _sql_constraints = [
-        ('token_uniq', 'unique (token)', 'Each API Token must be unique!'),
+        ('token_hash_uniq', 'unique (token_hash)', 'Each API Token must be unique!'),
     ]
 
+    # Fields whose change affects the cached result of _get_token_auth_data
+    _AUTH_CACHE_FIELDS = {'token_hash', 'active', 'user_id', 'scope'}
+
+    def _auto_init(self):
+        res = super(EssApiToken, self)._auto_init()
+        # Tokens used to be stored in plaintext in a 'token' column: hash them in place, then drop the column
+        if tools.column_exists(self.env.cr, self._table, 'token'):
+            self.env.cr.execute("""
+                UPDATE ess_api_token
+                   SET token_hash = encode(sha256(convert_to(token, 'UTF8')), 'hex')
+                 WHERE token IS NOT NULL AND token_hash IS NULL
+            """)
+            self.env.cr.execute("UPDATE ess_api_token SET token_revealed = TRUE WHERE token IS NOT NULL")
+            self.env.cr.execute("ALTER TABLE ess_api_token DROP COLUMN token")
+            _logger.info("ESS API tokens: plaintext 'token' column replaced by 'token_hash'.")
+        # Covering partial index for the _get_token_auth_data lookup: only active tokens, with every column
+        # the query reads, so it is an index-only scan (no heap fetch for id/user_id/scope)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS ess_api_token_lookup_idx
+                ON ess_api_token (token_hash) INCLUDE (id, user_id, scope)
+             WHERE active
+        """)
+        return res
+
     # --- CRUD Method Overrides ---
     @api.model_create_multi
     def create(self, vals_list):
         """
         Overrides the create method to automatically generate a secure token
-        for each new record.
+        for each new record. Only its hash is stored; a plaintext 'token' passed in vals
+        (e.g. imports or scripted provisioning, any string) is hashed as well.
+        A generated token is not displayed: the form's 'Save & Show Token' replaces it and shows the new one.
         """
+        # Random bytes for every token to generate in one os.urandom call; encoded exactly like
+        # secrets.token_urlsafe(32) (43-character URL-safe token)
+        to_generate = [vals for vals in vals_list if not vals.get('token') and not vals.get('token_hash')]
+        random_bytes = os.urandom(32 * len(to_generate)) if to_generate else b''
+        generated = {id(vals) for vals in to_generate}
+        for i, vals in enumerate(to_generate):
+            vals['token'] = base64.urlsafe_b64encode(random_bytes[i * 32:(i + 1) * 32]).rstrip(b'=').decode('ascii')
         for vals in vals_list:
-            if 'token' not in vals or not vals['token']: # Generate token if not provided or empty
-                vals['token'] = secrets.token_urlsafe(32) # Generates a 43-character URL-safe token
+            token_str = vals.pop('token', None)
+            if not token_str:
+                continue
+            if not vals.get('token_hash'):
+                vals['token_hash'] = hash_token(token_str)
+            if id(vals) not in generated: # Supplied by the caller, who therefore knows it
+                vals.setdefault('token_revealed', True)
             # Note: Group check for 'odoo_ess_connector.group_ess_api_access' was removed as per previous discussion.
             # If re-introducing, ensure the user being assigned (vals.get('user_id')) has the group.
-        return super(EssApiToken, self).create(vals_list)
+        return super(EssApiToken, self).create(vals_list) # No cache to clear: unknown tokens are never cached
 
     def write(self, vals):
         """
-        Overrides the write method to prevent modification of the 'token' field
-        after it has been generated.
+        Overrides the write method to prevent modification of the 'token_hash' field
+        after it has been generated (other than through action_regenerate_token).
         """
-        if 'token' in vals:
+        if 'token_hash' in vals and not self.env.context.get('ess_regenerate_token'):
             for record in self:
-                # Allow setting token if it's currently False (e.g. during import)
+                # Allow setting the hash if it's currently False (e.g. during import)
                 # but prevent changing an existing token.
-                if record.token and vals['token'] != record.token:
+                if record.token_hash and vals['token_hash'] != record.token_hash:
                     raise exceptions.UserError(
                         _("The API Token value cannot be changed after it has been generated.")
                     )
-        return super(EssApiToken, self).write(vals)
+        res = super(EssApiToken, self).write(vals)
+        if self._AUTH_CACHE_FIELDS.intersection(vals): # 'last_used' updates keep the cache
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super(EssApiToken, self).unlink()
+        self.env.registry.clear_cache()
+        return res
 
     # --- Action Methods (for buttons in UI) ---
     def action_toggle_active(self):
@@ -92,63 +185,191 @@ class EssApiToken(models.Model):
         return True # Necessary for Odoo client action to refresh view
 
     def action_regenerate_token(self):
-        """Generates a new token for the selected record(s), effectively revoking the old one."""
+        """
+        Generates a new token for the selected record, effectively revoking the old one,
+        and opens a dialog showing it. This is the only time the plaintext token is available.
+        """
+        self.ensure_one()
         if not self.env.user.has_group('base.group_system'): # Example: only allow admins to regenerate
             raise exceptions.AccessError(_("Only administrators can regenerate tokens directly."))
-        for record in self:
-            record.write({'token': secrets.token_urlsafe(32)})
-        return True
+        return self._reveal_new_token()
+
+    def action_reveal_new_token(self):
+        """
+        Form button shown until a token value has been displayed: the client saves the new record first,
+        then this replaces the token generated by create() (which nobody has seen, so nothing is revoked)
+        and opens the same dialog as action_regenerate_token.
+        """
+        self.ensure_one()
+        if not self.env.user.has_group('base.group_system'):
+            raise exceptions.AccessError(_("Only administrators can view new tokens."))
+        if self.token_revealed:
+            raise exceptions.UserError(_("This token has already been shown. Use 'Generate New Token' to replace it."))
+        return self._reveal_new_token()
+
+    def _reveal_new_token(self):
+        """Stores the hash of a new token and returns the dialog action showing it once."""
+        token_str = secrets.token_urlsafe(32)
+        self.with_context(ess_regenerate_token=True).write({'token_hash': hash_token(token_str), 'token_revealed': True})
+        # The dialog is opened on an unsaved record: the plaintext only lives in the client
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _("New API Token"),
+            'res_model': 'ess.api.token.reveal',
+            'views': [(False, 'form')],
+            'target': 'new',
+            'context': {'default_token_id': self.id, 'default_token': token_str},
+        }
 
 
     # --- Business Logic / Helper Methods ---
+    @api.model
+    def _get_token_auth_data(self, token_hash):
+        """
+        Resolves a token digest (see hash_token) to a (token_id, user_id, scope) tuple, or None if the
+        token is unknown, inactive or belongs to an inactive user.
+        Only found tokens are cached (see _get_found_token_auth_data): misses are looked up every time, so
+        random bearer tokens sent by unauthenticated clients never fill the registry's shared cache.
+        """
+        try:
+            return self._get_found_token_auth_data(token_hash)
+        except KeyError:
+            return None
+
+    @api.model
+    @tools.ormcache('token_hash')
+    def _get_found_token_auth_data(self, token_hash):
+        """
+        Cached part of _get_token_auth_data, per digest (no plaintext token is kept in the ormcache).
+        Raises KeyError when no usable token matches: ormcache does not store exceptions, so misses are
+        not cached. The cache is cleared when tokens or user activity change.
+        """
+        # One JOIN checks the token and its user's activity (no ORM records, no second query on res_users)
+        self.env.cr.execute("""
+            SELECT t.id, t.user_id, t.scope
+              FROM ess_api_token t
+              JOIN res_users u ON u.id = t.user_id
+             WHERE t.token_hash = %s AND t.active AND u.active
+             LIMIT 1
+        """, (token_hash,))
+        row = self.env.cr.fetchone()
+        if not row:
+            raise KeyError(token_hash)
+        return (row[0], row[1], row[2] or '')
+
     @api.model
     def _validate_token(self, token_str: str):
         """
         Validates an API token string.
         - Checks if the token exists and is active.
         - Checks if the associated user is active.
-        - Updates the 'last_used' timestamp on successful validation.
-        Returns the res.users recordset if valid, otherwise None.
+        - Records the 'last_used' timestamp on successful validation (written in batches, see _mark_last_used).
+        Returns a (res.users recordset, (token_id, user_id, scope)) pair if valid, so callers reuse
+        the lookup (see _get_token_auth_data), otherwise (None, None).
         """
         if not token_str:
             _logger.debug("Token validation: No token string provided.")
-            return None
+            return None, None
+        if not _TOKEN_RE.match(token_str):
+            _logger.warning("Token validation: Malformed token rejected without lookup.")
+            return None, None
 
-        # Search for an active token matching the provided string
-        token_record = self.search([
-            ('token', '=', token_str),
-            ('active', '=', True)
-        ], limit=1)
+        # Resolve the token from the cache (a DB lookup only on the first call per token)
+        auth_data = self._get_token_auth_data(hash_token(token_str))
+        if not auth_data:
+            _logger.warning(f"Token validation: Token '{token_str[:6]}...' not found, inactive or linked to an inactive user.")
+            return None, None
 
-        if not token_record:
-            _logger.warning(f"Token validation: Token '{token_str[:6]}...' not found or inactive.")
-            return None
+        token_id = auth_data[0]
+        user = self.env['res.users'].browse(auth_data[1])
+
+        # Record 'last_used' in memory; once the flush interval has elapsed, the pending timestamps
+        # are written in one UPDATE from a background cursor (and at process exit).
+        if self._mark_last_used(token_id):
+            try:
+                _LAST_USED_EXECUTOR.submit(_flush_last_used_in_new_cursor, self.env.cr.dbname)
+            except RuntimeError as e: # Executor already shut down
+                _logger.error(f"Token validation: Could not schedule the 'last_used' flush: {e}")
+
+        _logger.info(f"Token validation: Token '{token_str[:6]}...' successfully validated for user '{user.login}'.")
+        return user, auth_data
 
-        # Check if the user associated with the token is active
-        user = token_record.user_id
-        if not user or not user.active:
-            _logger.warning(f"Token validation: User '{user.login if user else 'N/A'}' for token '{token_str[:6]}...' is inactive or missing.")
+    @api.model
+    def _consume_rate_limit(self, token_id):
+        """
+        Takes one request from the token's bucket. Returns None if the call is allowed, otherwise the
+        number of seconds to wait (for a Retry-After header). Settings are read through the ormcached
+        get_param (no query).
+        """
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        capacity = int(IrConfigParameter.get_param('odoo_ess_connector.rate_limit_capacity', ESS_RATE_LIMIT_CAPACITY) or 0)
+        refill_per_sec = int(IrConfigParameter.get_param('odoo_ess_connector.rate_limit_refill_per_sec', ESS_RATE_LIMIT_REFILL_PER_SEC) or 0)
+        if capacity <= 0 or refill_per_sec <= 0:
             return None
+        key = (self.env.cr.dbname, token_id)
+        with _rate_limit_lock:
+            bucket = _rate_limit_buckets.get(key)
+            if bucket is None or (bucket.rate, bucket.capacity) != (refill_per_sec, capacity): # New token or settings changed
+                bucket = _rate_limit_buckets[key] = TokenBucket(rate=refill_per_sec, capacity=capacity)
+        wait = bucket.consume()
+        return math.ceil(wait) if wait is not None else None
 
-        # Update 'last_used' timestamp.
-        # This is a write operation. To avoid potential deadlocks or performance issues on
-        # high-frequency reads, it's done in a new cursor.
-        # It uses sudo() to ensure the write happens regardless of the current API user's
-        # direct write permissions on ess.api.token, as this is an internal tracking mechanism.
-        try:
-            with self.pool.cursor() as cr_new:
-                # Create a new environment with the new cursor and SUPERUSER_ID for this specific operation
-                env_new = api.Environment(cr_new, self.env.uid, self.env.context) # uid is current user, but operation is sudo
-                token_to_update = self.browse(token_record.id).with_env(env_new)
-                token_to_update.sudo().write({'last_used': fields.Datetime.now()})
-                # cr_new.commit() # Committing here might be too soon if main transaction fails
-                # Odoo usually handles commit at the end of the HTTP request.
-                # If this write absolutely must happen even if later code fails, a separate commit is needed.
-                # For now, let it be part of the main transaction.
-        except Exception as e:
-            _logger.error(f"Token validation: Failed to update 'last_used' for token ID {token_record.id}: {e}", exc_info=True)
-            # Do not fail the entire token validation just because 'last_used' couldn't be updated.
-            # This is an auxiliary piece of information.
+    @api.model
+    def _mark_last_used(self, token_id):
+        """
+        Records now() as the pending 'last_used' of a token (no query).
+        Returns True when the pending timestamps of this database are due to be flushed.
+        """
+        dbname = self.env.cr.dbname
+        now = time.monotonic()
+        with _last_used_lock:
+            _LAST_USED_PENDING[dbname][token_id] = fields.Datetime.now()
+            last_flush = _last_used_flushed_at.setdefault(dbname, now)
+            if now - last_flush >= _LAST_USED_FLUSH_INTERVAL:
+                _last_used_flushed_at[dbname] = now # Claimed by this caller
+                return True
+        return False
 
-        _logger.info(f"Token validation: Token '{token_str[:6]}...' successfully validated for user '{user.login}'.")
-        return user # Return the res.users record
\ No newline at end of file
+    @api.model
+    def _cron_flush_last_used(self):
+        """
+        Writes the pending 'last_used' timestamps of this database with a single UPDATE ... FROM (VALUES ...).
+        Only the calling process's _LAST_USED_PENDING is drained: in a prefork deployment the cron runs in
+        a worker that serves no API calls, so its buffer is empty. HTTP workers flush their own timestamps
+        from _validate_token and at exit; the cron only matters for threaded (single-process) servers.
+        """
+        dbname = self.env.cr.dbname
+        with _last_used_lock:
+            _last_used_flushed_at[dbname] = time.monotonic()
+            pending = _LAST_USED_PENDING.pop(dbname, None)
+        if not pending:
+            return
+        execute_values(self.env.cr, """
+            UPDATE ess_api_token SET last_used = v.ts
+              FROM (VALUES %s) AS v(id, ts)
+             WHERE ess_api_token.id = v.id
+        """, list(pending.items()))
+        self.invalidate_model(['last_used'])
+
+
+def _flush_last_used_in_new_cursor(dbname):
+    """Flushes the pending 'last_used' timestamps of a database in its own cursor (committed on exit)."""
+    try:
+        with Registry(dbname).cursor() as cr:
+            api.Environment(cr, SUPERUSER_ID, {})['ess.api.token']._cron_flush_last_used()
+    except Exception as e:
+        # Do not fail the token validation just because 'last_used' couldn't be updated.
+        # This is an auxiliary piece of information.
+        _logger.error(f"Token validation: Failed to update 'last_used' for database {dbname}: {e}", exc_info=True)
+
+
+@atexit.register
+def _flush_all_last_used():
+    """Writes the 'last_used' timestamps still pending in this process on server shutdown."""
+    for dbname in list(_LAST_USED_PENDING):
+        if _LAST_USED_PENDING[dbname]:
+            _flush_last_used_in_new_cursor(dbname)
+
+
+# atexit runs handlers last-in first-out: in-flight background flushes finish before the final one above
+atexit.register(_LAST_USED_EXECUTOR.shutdown)
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields
+
+class EssApiTokenReveal(models.TransientModel):
+    _name = 'ess.api.token.reveal'
+    _description = 'Show a newly generated ESS API Token'
+
+    # Filled from the context by ess.api.token.action_regenerate_token; the dialog is never saved
+    token_id = fields.Many2one('ess.api.token', string='API Token', readonly=True)
+    token = fields.Char(string='Token', readonly=True)
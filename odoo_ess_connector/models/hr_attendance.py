@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+from odoo import models, tools
+
+class HrAttendance(models.Model):
+    _inherit = 'hr.attendance'
+
+    def _auto_init(self):
+        res = super(HrAttendance, self)._auto_init()
+        # ESS today's attendance log: employee_id = X AND check_in in [start, end) ORDER BY check_in.
+        # Index-range scan with pre-sorted output instead of filtering by employee and sorting.
+        tools.create_index(self.env.cr, 'hr_attendance_ess_employee_check_in_index',
+                           self._table, ['employee_id', 'check_in'])
+        # ESS check-in guard: does the employee have an open attendance (check_out IS NULL)?
+        # Partial index: only open attendances are indexed, so it stays tiny.
+        tools.create_index(self.env.cr, 'hr_attendance_ess_open_employee_index',
+                           self._table, ['employee_id'], where='check_out IS NULL')
+        return res
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+from odoo import models, tools
+
+class HrEmployee(models.Model):
+    _inherit = 'hr.employee'
+
+    def _auto_init(self):
+        res = super(HrEmployee, self)._auto_init()
+        # ESS admin employee search uses ilike on these columns; trigram GIN indexes avoid
+        # sequential scans on large HR tables. Requires the pg_trgm extension.
+        if self.pool.has_trigram:
+            for column in ('name', 'work_email', 'barcode'):
+                tools.create_index(self.env.cr, f'hr_employee_ess_{column}_trgm_index',
+                                   self._table, [f'{column} gin_trgm_ops'], 'gin')
+        return res
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api, tools
+
+class HrExpense(models.Model):
+    _inherit = 'hr.expense'
+
+    @api.model
+    @tools.ormcache('company_id')
+    def _ess_default_expense_product_id(self, company_id):
+        """
+        Returns the ID of the default 'Can be Expensed' product used by the ESS API, or False.
+        Cached per company; the cache is cleared when expensable products change (see product.template
+        and product.product).
+        """
+        product = self.env['product.product'].sudo().search([
+            ('can_be_expensed', '=', True),
+            ('company_id', 'in', [False, company_id]),
+        ], limit=1)
+        return product.id
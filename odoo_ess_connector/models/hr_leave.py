@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+from odoo import models, tools
+
+class HrLeave(models.Model):
+    _inherit = 'hr.leave'
+
+    def _auto_init(self):
+        res = super(HrLeave, self)._auto_init()
+        # ESS leave endpoints filter on employee and state, and the next day off on request_date_from.
+        tools.create_index(self.env.cr, 'hr_leave_ess_employee_state_date_from_index',
+                           self._table, ['employee_id', 'state', 'request_date_from'])
+        return res
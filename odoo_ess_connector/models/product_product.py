@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    # Variants are what hr.expense._ess_default_expense_product_id returns: archiving, unarchiving or
+    # recategorising one must clear the cache as well (see product.template for template changes)
+    _ESS_EXPENSE_PRODUCT_FIELDS = {'can_be_expensed', 'active', 'company_id'}
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(ProductProduct, self).create(vals_list)
+        if any(records.mapped('can_be_expensed')): # Also true for new variants of an expensable template
+            self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super(ProductProduct, self).write(vals)
+        if self._ESS_EXPENSE_PRODUCT_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        expensable = any(self.mapped('can_be_expensed'))
+        res = super(ProductProduct, self).unlink()
+        if expensable:
+            self.env.registry.clear_cache()
+        return res
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    # Fields that affect which product hr.expense._ess_default_expense_product_id returns
+    _ESS_EXPENSE_PRODUCT_FIELDS = {'can_be_expensed', 'active', 'company_id'}
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(ProductTemplate, self).create(vals_list)
+        if any(vals.get('can_be_expensed') for vals in vals_list):
+            self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super(ProductTemplate, self).write(vals)
+        if self._ESS_EXPENSE_PRODUCT_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        expensable = any(self.mapped('can_be_expensed'))
+        res = super(ProductTemplate, self).unlink()
+        if expensable:
+            self.env.registry.clear_cache()
+        return res
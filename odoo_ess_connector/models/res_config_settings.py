@@ -14,8 +14,60 @@ class ResConfigSettings(models.TransientModel):
     ess_allowed_ips = fields.Char(
         string="Allowed IPs for ESS API",
         config_parameter='odoo_ess_connector.ess_allowed_ips',
-        help="Comma-separated list of IP addresses allowed to access the ESS API. Leave empty to allow all."
+        help="Comma-separated list of IP addresses or CIDR networks (e.g. 203.0.113.0/24) allowed to access the ESS API. Leave empty to allow all."
     )
+    ess_rate_limit_capacity = fields.Integer(
+        string="Rate Limit Burst (requests)",
+        config_parameter='odoo_ess_connector.rate_limit_capacity',
+        default=0,
+        help="Maximum number of back-to-back ESS API calls allowed per token before calls are rejected with "
+             "HTTP 429. 0 (the default) disables rate limiting: the ESS Portal backend shares one token for "
+             "the whole tenant. Limits apply per Odoo worker process."
+    )
+    ess_rate_limit_refill_per_sec = fields.Integer(
+        string="Rate Limit (requests/s)",
+        config_parameter='odoo_ess_connector.rate_limit_refill_per_sec',
+        default=10,
+        help="Sustained number of ESS API calls per second allowed per token once the burst is used up."
+    )
+    ess_log_level = fields.Selection(
+        [('all', "All calls"),
+         ('writes_only', "Write calls and failures"),
+         ('failures_only', "Failures only")],
+        string="API Log Level",
+        config_parameter='odoo_ess_connector.ess_log_level',
+        default='writes_only',
+        help="Which ESS API calls are recorded in the API log. Skipping successful read-only (GET) calls "
+             "removes most log inserts on read-heavy workloads, at the cost of no audit trail for those reads."
+    )
+    ess_log_retention_days = fields.Integer(
+        string="API Log Retention (days)",
+        config_parameter='odoo_ess_connector.log_retention_days',
+        default=90,
+        help="API log entries older than this are deleted by the daily cleanup (unless 'Keep API Logs Forever' is set)."
+    )
+    ess_log_keep_forever = fields.Boolean(
+        string="Keep API Logs Forever",
+        config_parameter='odoo_ess_connector.log_keep_forever',
+        help="Disables the daily cleanup of old API log entries: the retention period is ignored."
+    )
+    ess_log_buffer_max_size = fields.Integer(
+        string="API Log Buffer Size",
+        config_parameter='odoo_ess_connector.log_buffer_max_size',
+        default=100,
+        help="Number of API log entries kept in memory before they are written to the database in one batch."
+    )
+    ess_log_buffer_flush_interval = fields.Integer(
+        string="API Log Flush Interval (s)",
+        config_parameter='odoo_ess_connector.log_buffer_flush_interval',
+        default=30,
+        help="Maximum age, in seconds, of buffered API log entries before the next API call writes them."
+    )
+    def set_values(self):
+        super(ResConfigSettings, self).set_values()
+        # The API log buffer keeps its settings in memory; reload them now rather than on the next flush
+        self.env['ess.api.log']._refresh_buffer_settings()
+
     # We might not need a specific field for the button if it just opens the token view.
     # If it were to perform an action like generating a specific token,
     # then a related field or a method on res.config.settings might be used.
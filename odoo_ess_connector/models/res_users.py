@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api, tools
+
+class ResUsers(models.Model):
+    _inherit = 'res.users'
+
+    # Fields cached by ess.api.token._get_token_auth_data / _ess_get_tz_name
+    _ESS_CACHED_FIELDS = {'active', 'tz'}
+
+    @api.model
+    @tools.ormcache('uid')
+    def _ess_get_tz_name(self, uid):
+        """
+        Returns the timezone name of the given user (False if unset) for the ESS attendance endpoints.
+        Cached per user; the cache is cleared when a user's tz changes.
+        """
+        return self.sudo().browse(uid).tz
+
+    def write(self, vals):
+        res = super(ResUsers, self).write(vals)
+        if self._ESS_CACHED_FIELDS.intersection(vals):
+            # Tokens of (de)activated users and user timezones are ormcached for the ESS API
+            self.env.registry.clear_cache()
+        return res